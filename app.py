@@ -1,28 +1,177 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-import joblib
-import pandas as pd
-import numpy as np
+from startup import startup_profile, LazyResource
+
+# Load environment variables (optional) before importing modules that read
+# their settings at import time (logging, database, HTTP clients)
+with startup_profile.step('dotenv', kind='import'):
+    from dotenv import load_dotenv
+try:
+    with startup_profile.step('load_dotenv'):
+        load_dotenv()
+    dotenv_error = None
+except Exception as e:
+    dotenv_error = e
+
+with startup_profile.step('flask', kind='import'):
+    from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, stream_with_context, g
 from datetime import datetime
 import os
-from dotenv import load_dotenv
-from ibm_watson import AssistantV2
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
+import re
+import time
+import hmac
+import hashlib
+import logging
+from werkzeug.middleware.proxy_fix import ProxyFix
+from logging_setup import configure_logging, restart_after_fork as restart_logging_after_fork
 import json
-import requests
-import jwt
 from functools import wraps
-from database import db_manager
+with startup_profile.step('database', kind='import'):
+    from database import db_manager
+with startup_profile.step('http_client', kind='import'):
+    from http_client import identity_http, HTTPClient
+from session_store import create_session_interface
+from oidc import create_appid_provider, TokenVerificationError
+from intents import IntentMatcher, INTENTS_PATH
+from conversations import ConversationStore, shared_conversation_store
+from watson_chat import WatsonChatBackend, ResponseCache
+from metrics import REGISTRY, CACHE_HIT_RATIO, render_prometheus
+from profiler import create_profiler
+from assets import AssetManifest
+from history import PredictionHistory
+from ratelimit import create_admission_controller
 
-# Load environment variables (optional)
-try:
-    load_dotenv()
-except Exception as e:
-    print(f"Warning: Could not load .env file: {e}")
-    print("Continuing without environment variables...")
+# Buffered structured logging; request threads never block on log output
+configure_logging()
+logger = logging.getLogger(__name__)
+
+if dotenv_error is not None:
+    logger.warning(f"Could not load .env file: {dotenv_error}")
+    logger.warning("Continuing without environment variables...")
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Trust X-Forwarded-For from this many proxies in front of the app, so
+# request.remote_addr (and the rate-limit key) is the real client address
+PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', '0'))
+if PROXY_FIX_X_FOR > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR)
+
+# Latency of every Flask route and of each prediction stage
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'Flask request latency by route', ('route', 'method', 'status')
+)
+MODEL_STAGE_SECONDS = REGISTRY.histogram(
+    'model_stage_seconds', 'Latency of prediction stages', ('stage',)
+)
+
+# Admin-controlled sampling profiler; off unless PROFILER_ENABLED is set or an admin starts it
+request_profiler = create_profiler()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if request_profiler.enabled:
+        g.profiled = request_profiler.begin(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by URL rule rather than raw path to keep the number of series bounded
+        labels = {
+            'route': request.url_rule.rule if request.url_rule else 'unmatched',
+            'method': request.method,
+            'status': str(response.status_code)
+        }
+        # Observed when the server closes the body, so streamed responses are timed to their last chunk
+        response.call_on_close(lambda: HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, **labels))
+    return response
+
+# gthread runs at most GUNICORN_THREADS requests per worker, so the in-flight
+# caps must sit below it to shed anything instead of queueing in gunicorn. One
+# thread is kept free for health checks, metrics and static files, and chat is
+# held to half the threads so slow Watson calls cannot starve /predict.
+REQUEST_THREADS = int(os.getenv('GUNICORN_THREADS', '4'))
+REQUEST_SLOTS = max(REQUEST_THREADS - 1, 1)
+CHAT_SLOTS = max(REQUEST_THREADS // 2, 1)
+
+# Per-client budgets for expensive endpoints: (endpoints, requests/seconds, max in flight per process)
+ADMISSION_BUDGETS = {
+    'predict': (('predict',), '30/60', REQUEST_SLOTS),
+    'chatbot': (('chatbot_message', 'chatbot_message_stream'), '20/60', CHAT_SLOTS),
+    'oauth': (('auth_callback', 'google_auth_callback'), '10/60', max(REQUEST_THREADS // 2, 1)),
+}
+admission_controller = create_admission_controller(
+    ADMISSION_BUDGETS, exempt=('static', 'built_asset', 'ready', 'metrics'), max_in_flight=REQUEST_SLOTS
+)
+
+def client_key():
+    """Rate-limit key: the signed-in user, or the client address before sign-in"""
+    user = session.get('user') or {}
+    user_id = user.get('sub') or user.get('email')
+    return f"user:{user_id}" if user_id else f"ip:{request.remote_addr or 'unknown'}"
+
+@app.before_request
+def admit_request():
+    """Refuse requests over their client's budget or beyond the concurrency caps before doing any work"""
+    slots, rejection = admission_controller.admit(request.endpoint, client_key)
+    if rejection is None:
+        g.admission_slots = slots
+        return None
+    
+    logger.warning(f"Refused {request.endpoint} ({rejection.group}: {rejection.reason}) for {request.remote_addr}")
+    if rejection.status == 429:
+        message = 'Too many requests. Please wait a moment and try again.'
+    else:
+        message = 'The service is busy. Please try again shortly.'
+    if request.accept_mimetypes.best == 'text/html':
+        response = Response(message, status=rejection.status, mimetype='text/plain')
+    else:
+        response = jsonify({'success': False, 'error': message, 'retry_after': rejection.retry_after})
+        response.status_code = rejection.status
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+@app.teardown_request
+def finish_request_profile(exc):
+    # Runs after streamed responses finish, so their generators are sampled too
+    if g.pop('profiled', False):
+        request_profiler.end()
+
+@app.after_request
+def release_admission_when_sent(response):
+    # Flask may tear the request down before a streamed body is generated, so
+    # the slots are handed back only when the server closes the response
+    slots = g.pop('admission_slots', None)
+    if slots:
+        response.call_on_close(lambda: admission_controller.release(slots))
+    return response
+
+@app.teardown_request
+def release_admission(exc):
+    # Requests that never produced a response still hold their slots here
+    admission_controller.release(g.pop('admission_slots', ()))
+
+# Fingerprinted, precompressed builds of static/ (see build_assets.py)
+asset_manifest = AssetManifest()
+app.jinja_env.globals['asset_url'] = asset_manifest.url
+
+@app.template_filter('timestamp')
+def format_timestamp(value):
+    """Render an epoch timestamp like 'Mar 04, 2025 14:30'"""
+    return datetime.fromtimestamp(value).strftime('%b %d, %Y %H:%M') if value else ''
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    """Serve a built asset with immutable caching and the best encoding the client accepts"""
+    return asset_manifest.send(filename, request.accept_encodings)
+
+# Keep session data server-side; the cookie only carries a signed session id
+with startup_profile.step('session_interface'):
+    session_interface = create_session_interface()
+if session_interface:
+    app.session_interface = session_interface
+
 # IBM Cloud App ID Configuration
 APPID_TENANT_ID = os.getenv('APPID_TENANT_ID')
 APPID_CLIENT_ID = os.getenv('APPID_CLIENT_ID')
@@ -32,57 +181,163 @@ APPID_REDIRECT_URI = os.getenv('APPID_REDIRECT_URI', 'http://localhost:5000/auth
 
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', 'your_google_client_id_here')
+GOOGLE_TOKEN_URL = os.getenv('GOOGLE_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v2/userinfo')
+
+MODEL_PATH = os.getenv('MODEL_PATH', 'anxiety_depression_model.joblib')
+
+# Connect to the database in the background so startup never waits on Cloudant
+with startup_profile.step('db_manager.start'):
+    db_manager.start()
+
+# App ID discovery document and signing keys, cached in process
+appid_provider = create_appid_provider()
+appid_provider.prefetch()
+
+# Recorded with each prediction; defaults to a digest of the model file, set when the model loads
+model_version = os.getenv('MODEL_VERSION')
+
+def file_digest(path, length=12):
+    """Short sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
 
-# Load the model
-model = joblib.load('anxiety_depression_model.joblib')
+def load_model():
+    """Load the model together with the libraries prediction needs"""
+    global model_version
+    with startup_profile.step('pandas', kind='import'):
+        import pandas  # noqa: F401
+    with startup_profile.step('joblib', kind='import'):
+        import joblib
+    with startup_profile.step('joblib.load'):
+        model = joblib.load(MODEL_PATH)
+    if not model_version:
+        model_version = file_digest(MODEL_PATH)
+    return model
+
+# The model is loaded on first use; warming starts now so it is usually ready by the first /predict
+model_resource = LazyResource('model', load_model, profile=startup_profile)
+
+def get_model():
+    """Return the loaded model, waiting for it if it is still loading"""
+    return model_resource.get()
+
+# One Watson call per admitted chat request at most: a chat request never waits
+# for a pool slot, and calls still running after their caller timed out make
+# the next request fall back to local intents at once (saturation fallback)
+WATSON_MAX_WORKERS = int(
+    os.getenv('ASSISTANT_MAX_WORKERS') or os.getenv('MAX_IN_FLIGHT_CHATBOT') or CHAT_SLOTS
+)
+
+# Dedicated pooled client for Watson Assistant; retries are left to the local fallback
+watson_http = HTTPClient(
+    'watson',
+    pool_size=WATSON_MAX_WORKERS,
+    connect_timeout=1.0,
+    read_timeout=float(os.getenv('ASSISTANT_TIMEOUT', '2.5')),
+    retries=0
+)
 
 # Initialize Watson Assistant
+def missing_watson_settings():
+    """Names of the Watson Assistant settings that are not configured"""
+    required = ['ASSISTANT_ID', 'ASSISTANT_URL']
+    # 'noauth' is for the local stub server (stubs/watson_stub.py)
+    if os.getenv('ASSISTANT_AUTH_TYPE', 'iam').lower() != 'noauth':
+        required.append('ASSISTANT_IAM_APIKEY')
+    return [name for name in required if not os.getenv(name)]
+
 def init_watson_assistant():
     try:
-        # Try to get from environment variables first
+        from ibm_watson import AssistantV2
+        from ibm_cloud_sdk_core.authenticators import IAMAuthenticator, NoAuthAuthenticator
+        
+        missing = missing_watson_settings()
+        if missing:
+            logger.warning(f"Watson Assistant needs {', '.join(missing)}; falling back to local intents")
+            return None
+        
         api_key = os.getenv('ASSISTANT_IAM_APIKEY')
         url = os.getenv('ASSISTANT_URL')
+        logger.info(f"Initializing Watson Assistant with URL: {url}")
         
-        # If not found, use hardcoded values as fallback
-        if not api_key:
-            api_key = 'oGVubRECEeFhuFc5F4CvIk58koNLwW5jcwBX5NtKka46'
-        if not url:
-            url = 'https://api.us-south.assistant.watson.cloud.ibm.com/instances/a082ae29-2af3-4c79-bdc6-3f4027c5493b'
-            
-        print(f"Initializing Watson Assistant with URL: {url}")
-        print(f"API Key found: {'Yes' if api_key else 'No'}")
-        
-        authenticator = IAMAuthenticator(api_key)
+        # 'noauth' is for the local stub server (stubs/watson_stub.py)
+        if os.getenv('ASSISTANT_AUTH_TYPE', 'iam').lower() == 'noauth':
+            authenticator = NoAuthAuthenticator()
+        else:
+            authenticator = IAMAuthenticator(api_key)
         assistant = AssistantV2(
             version='2021-11-27',
             authenticator=authenticator
         )
         assistant.set_service_url(url)
         
-        # Test the connection
-        print("Testing Watson Assistant connection...")
+        # Pooled keep-alive connections and strict timeouts for every call
+        assistant.set_http_client(watson_http.session)
+        assistant.set_http_config({'timeout': watson_http.timeout})
         return assistant
     except Exception as e:
-        print(f"Error initializing Watson Assistant: {e}")
+        logger.error(f"Error initializing Watson Assistant: {e}")
         return None
 
-# Global assistant instance
-assistant = init_watson_assistant()
+# Watson Assistant is created on first use; nothing pays for it at import
+assistant_resource = LazyResource('watson_assistant', init_watson_assistant, profile=startup_profile)
+
+# CHATBOT_BACKEND=watson answers from Watson Assistant, falling back to local intents
+watson_chat = None
+if os.getenv('CHATBOT_BACKEND', 'local').lower() == 'watson':
+    missing_settings = missing_watson_settings()
+    if not missing_settings:
+        watson_chat = WatsonChatBackend(
+            assistant_resource,
+            os.getenv('ASSISTANT_ID'),
+            timeout=float(os.getenv('ASSISTANT_TIMEOUT', '2.5')),
+            max_workers=WATSON_MAX_WORKERS,
+            cache=ResponseCache(
+                max_entries=int(os.getenv('ASSISTANT_CACHE_SIZE', '1000')),
+                ttl=int(os.getenv('ASSISTANT_CACHE_TTL', '3600'))
+            )
+        )
+    else:
+        logger.warning(f"CHATBOT_BACKEND=watson requires {', '.join(missing_settings)}; using local intents")
+
+# Chatbot intents are loaded and compiled once per process
+with startup_profile.step('intent_matcher'):
+    intent_matcher = IntentMatcher.from_file(os.getenv('INTENTS_PATH', INTENTS_PATH))
 
-# Get the feature names from the model
-FEATURE_NAMES = model.feature_names_in_ 
+# Per-session chatbot state, bounded in memory and optionally persisted on eviction.
+# CHAT_STORE=sqlite shares it between worker processes instead (gunicorn.conf.py
+# sets this whenever it runs more than one worker).
+conversation_store = ConversationStore(
+    max_sessions=int(os.getenv('CHAT_MAX_SESSIONS', '5000')),
+    ttl=int(os.getenv('CHAT_SESSION_TTL', '1800')),
+    max_turns=int(os.getenv('CHAT_MAX_TURNS', '20')),
+    db=db_manager if os.getenv('CHAT_PERSIST', 'false').lower() == 'true' else None,
+    shared=(shared_conversation_store(os.getenv('CHAT_SQLITE_PATH', 'conversations.db'))
+            if os.getenv('CHAT_STORE', 'memory').lower() == 'sqlite' else None)
+)
+
+# Assessment results are buffered and written to the database in batches
+prediction_history = PredictionHistory(
+    db_manager,
+    flush_interval=float(os.getenv('HISTORY_FLUSH_INTERVAL', '2.0')),
+    batch_size=int(os.getenv('HISTORY_BATCH_SIZE', '100')),
+    max_buffer=int(os.getenv('HISTORY_MAX_BUFFER', '10000'))
+)
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '20'))
 
 # Authentication helper functions
 def get_appid_config():
-    """Get App ID configuration from discovery endpoint"""
+    """Get App ID configuration from the cached discovery document"""
     try:
         if not APPID_DISCOVERY_ENDPOINT:
             return None
-        response = requests.get(APPID_DISCOVERY_ENDPOINT)
-        response.raise_for_status()
-        return response.json()
+        return appid_provider.get_config()
     except Exception as e:
-        print(f"Error getting App ID config: {e}")
+        logger.error(f"Error getting App ID config: {e}")
         return None
 
 def login_required(f):
@@ -94,6 +349,12 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def regenerate_session():
+    """Give the session a new id on login so one planted before it cannot be reused"""
+    # Cookie sessions carry their data in the cookie and have no id to fix
+    if hasattr(session, 'regenerate'):
+        session.regenerate()
+
 def get_user_info():
     """Get user information from session"""
     return session.get('user', {})
@@ -102,6 +363,14 @@ def is_authenticated():
     """Check if user is authenticated"""
     return 'user' in session and 'access_token' in session
 
+def history_user_id(user):
+    """Stable key for a user's prediction history"""
+    return user.get('sub') or user.get('email')
+
+def is_admin(user):
+    """Check if user has admin privileges (you can implement proper admin check)"""
+    return bool(user.get('email')) and user.get('email').endswith('@admin.com')
+
 def save_user_to_database(user_data, request_info=None):
     """Save user data to Cloudant database"""
     try:
@@ -113,13 +382,13 @@ def save_user_to_database(user_data, request_info=None):
         # Save user to database
         saved_user = db_manager.save_user(user_data)
         if saved_user:
-            print(f"User saved to database: {user_data.get('email', 'Unknown')}")
+            logger.info("User saved to database", extra={'fields': {'email': user_data.get('email', 'Unknown')}})
             return True
         else:
-            print("Failed to save user to database")
+            logger.warning("Failed to save user to database")
             return False
     except Exception as e:
-        print(f"Error saving user to database: {e}")
+        logger.error(f"Error saving user to database: {e}")
         return False
 
 def update_user_login(user_id, login_data, request_info=None):
@@ -131,11 +400,11 @@ def update_user_login(user_id, login_data, request_info=None):
         
         updated_user = db_manager.update_user_login(user_id, login_data)
         if updated_user:
-            print(f"User login updated: {user_id}")
+            logger.info("User login updated", extra={'fields': {'user_id': user_id}})
             return True
         return False
     except Exception as e:
-        print(f"Error updating user login: {e}")
+        logger.error(f"Error updating user login: {e}")
         return False 
 
 @app.route('/')
@@ -188,6 +457,13 @@ def initiate_oauth_login(provider):
     
     return redirect(auth_url)
 
+def reject_unverified_login():
+    """Drop the tokens of a login whose ID token could not be verified"""
+    for key in ('access_token', 'id_token', 'refresh_token', 'oauth_state'):
+        session.pop(key, None)
+    flash('Could not verify your identity. Please sign in again.', 'error')
+    return redirect(url_for('auth_error'))
+
 @app.route('/auth/callback')
 def auth_callback():
     """Handle OAuth callback from IBM Cloud App ID"""
@@ -223,20 +499,21 @@ def auth_callback():
             'client_secret': APPID_CLIENT_SECRET
         }
         
-        response = requests.post(config['token_endpoint'], data=token_data)
+        response = identity_http.post(config['token_endpoint'], endpoint='appid_token', data=token_data)
         response.raise_for_status()
         tokens = response.json()
         
-        # Store tokens in session
+        # Store tokens in session, under a new session id
+        regenerate_session()
         session['access_token'] = tokens['access_token']
         session['id_token'] = tokens.get('id_token')
         session['refresh_token'] = tokens.get('refresh_token')
         
-        # Decode and store user information
+        # Verify and store user information
         if tokens.get('id_token'):
             try:
-                # Decode without verification for now (in production, verify the signature)
-                user_info = jwt.decode(tokens['id_token'], options={"verify_signature": False})
+                # Signature and claims are checked locally against the cached JWKS
+                user_info = appid_provider.verify_id_token(tokens['id_token'])
                 provider = session.get('auth_provider', 'ibm')
                 
                 session['user'] = {
@@ -247,14 +524,13 @@ def auth_callback():
                     'email_verified': user_info.get('email_verified', False),
                     'provider': provider
                 }
+            except TokenVerificationError as e:
+                logger.warning(f"ID token verification failed: {e}")
+                return reject_unverified_login()
             except Exception as e:
-                print(f"Error decoding ID token: {e}")
-                provider = session.get('auth_provider', 'ibm')
-                session['user'] = {
-                    'name': 'User', 
-                    'email': 'user@example.com',
-                    'provider': provider
-                }
+                # Anything else is also an unverified identity; never sign in without one
+                logger.error(f"Error decoding ID token: {e}")
+                return reject_unverified_login()
         
         # Clear OAuth state
         session.pop('oauth_state', None)
@@ -263,7 +539,7 @@ def auth_callback():
         return redirect(url_for('loading'))
         
     except Exception as e:
-        print(f"Error during token exchange: {e}")
+        logger.error(f"Error during token exchange: {e}")
         provider = session.get('auth_provider', 'google')
         return redirect(url_for('email_selection', provider=provider))
 
@@ -298,6 +574,36 @@ def google_account_picker():
     
     return render_template('google_simple_login.html', google_client_id=GOOGLE_CLIENT_ID)
 
+def exchange_google_code(code, redirect_uri):
+    """Exchange a Google authorization code for the user's profile
+    
+    Returns (user_info, None) on success or (None, error message) on failure.
+    """
+    token_data = {
+        'client_id': GOOGLE_CLIENT_ID,
+        'client_secret': os.getenv('GOOGLE_CLIENT_SECRET', ''),
+        'code': code,
+        'grant_type': 'authorization_code',
+        'redirect_uri': redirect_uri
+    }
+    
+    response = identity_http.post(GOOGLE_TOKEN_URL, endpoint='google_token', data=token_data)
+    if response.status_code != 200:
+        return None, 'Token exchange failed'
+    
+    access_token = response.json().get('access_token')
+    
+    # Get user info from Google
+    user_response = identity_http.get(
+        GOOGLE_USERINFO_URL,
+        endpoint='google_userinfo',
+        headers={'Authorization': f'Bearer {access_token}'}
+    )
+    if user_response.status_code != 200:
+        return None, 'User info fetch failed'
+    
+    return user_response.json(), None
+
 @app.route('/google/auth/callback', methods=['GET', 'POST'])
 def google_auth_callback():
     """Handle Google authentication callback"""
@@ -308,32 +614,11 @@ def google_auth_callback():
             if not code:
                 return redirect(url_for('email_selection', provider='google'))
             
-            # Exchange code for token
-            token_data = {
-                'client_id': GOOGLE_CLIENT_ID,
-                'client_secret': os.getenv('GOOGLE_CLIENT_SECRET', ''),
-                'code': code,
-                'grant_type': 'authorization_code',
-                'redirect_uri': request.url
-            }
-            
-            response = requests.post('https://oauth2.googleapis.com/token', data=token_data)
-            if response.status_code != 200:
+            # Exchange code for token and fetch user info
+            user_info, error = exchange_google_code(code, request.url)
+            if error:
                 return redirect(url_for('email_selection', provider='google'))
             
-            token_info = response.json()
-            access_token = token_info.get('access_token')
-            
-            # Get user info from Google
-            user_response = requests.get(
-                f'https://www.googleapis.com/oauth2/v2/userinfo?access_token={access_token}'
-            )
-            
-            if user_response.status_code != 200:
-                return redirect(url_for('email_selection', provider='google'))
-            
-            user_info = user_response.json()
-            
         else:
             # Handle JWT token callback
             data = request.json
@@ -356,29 +641,9 @@ def google_auth_callback():
                 
             elif code:
                 # Handle authorization code
-                token_data = {
-                    'client_id': GOOGLE_CLIENT_ID,
-                    'client_secret': os.getenv('GOOGLE_CLIENT_SECRET', ''),
-                    'code': code,
-                    'grant_type': 'authorization_code',
-                    'redirect_uri': data.get('redirect_uri', '')
-                }
-                
-                response = requests.post('https://oauth2.googleapis.com/token', data=token_data)
-                if response.status_code != 200:
-                    return jsonify({'success': False, 'error': 'Token exchange failed'}), 400
-                
-                token_info = response.json()
-                access_token = token_info.get('access_token')
-                
-                user_response = requests.get(
-                    f'https://www.googleapis.com/oauth2/v2/userinfo?access_token={access_token}'
-                )
-                
-                if user_response.status_code != 200:
-                    return jsonify({'success': False, 'error': 'User info fetch failed'}), 400
-                
-                user_info = user_response.json()
+                user_info, error = exchange_google_code(code, data.get('redirect_uri', ''))
+                if error:
+                    return jsonify({'success': False, 'error': error}), 400
             else:
                 return jsonify({'success': False, 'error': 'No credential or code provided'}), 400
         
@@ -393,7 +658,8 @@ def google_auth_callback():
             'picture': user_info.get('picture')
         }
         
-        # Store user information in session
+        # Store user information in session, under a new session id
+        regenerate_session()
         session['user'] = user_data
         session['access_token'] = 'google_token_' + str(user_info.get('id', user_info.get('sub', '')))
         
@@ -406,7 +672,7 @@ def google_auth_callback():
             return jsonify({'success': True})
         
     except Exception as e:
-        print(f"Error processing Google authentication: {e}")
+        logger.error(f"Error processing Google authentication: {e}")
         if request.method == 'GET':
             return redirect(url_for('email_selection', provider='google'))
         else:
@@ -460,7 +726,8 @@ def email_login():
                 # Try to save new user to database (optional)
                 save_user_to_database(user_data, request)
             
-            # Store in session regardless of database status
+            # Store in session regardless of database status, under a new session id
+            regenerate_session()
             session['user'] = user_data
             session['access_token'] = 'email_token_' + user_data['sub']
             
@@ -509,7 +776,8 @@ def email_signup():
             # Try to save user to database (optional)
             database_saved = save_user_to_database(user_data, request)
             
-            # Store user in session regardless of database status
+            # Store user in session regardless of database status, under a new session id
+            regenerate_session()
             session['user'] = user_data
             session['access_token'] = 'email_token_' + user_data['sub']
             
@@ -528,7 +796,27 @@ def profile():
     """User profile page"""
     user = get_user_info()
     current_date = datetime.now()
-    return render_template('profile.html', user=user, current_date=current_date)
+    history, history_cursor = [], None
+    if history_user_id(user):
+        history, history_cursor = prediction_history.page(history_user_id(user), limit=HISTORY_PAGE_SIZE)
+    return render_template('profile.html', user=user, current_date=current_date,
+                         history=history, history_cursor=history_cursor)
+
+@app.route('/api/history')
+@login_required
+def api_history():
+    """The signed-in user's past assessments, newest first; pass next_cursor as ``before`` for the next page"""
+    user_id = history_user_id(get_user_info())
+    if not user_id:
+        return jsonify({'success': True, 'entries': [], 'next_cursor': None})
+    
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    
+    entries, next_cursor = prediction_history.page(user_id, limit=limit, before=request.args.get('before') or None)
+    return jsonify({'success': True, 'entries': entries, 'next_cursor': next_cursor})
 
 @app.route('/admin/dashboard')
 @login_required
@@ -536,8 +824,8 @@ def admin_dashboard():
     """Admin dashboard with user statistics"""
     user = get_user_info()
     
-    # Check if user is admin (you can implement proper admin check)
-    if not user.get('email') or not user.get('email').endswith('@admin.com'):
+    # Check if user is admin
+    if not is_admin(user):
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('home'))
     
@@ -552,13 +840,22 @@ def admin_dashboard():
                          recent_users=recent_users,
                          current_date=current_date)
 
+@app.route('/admin/db/status')
+@login_required
+def admin_db_status():
+    """Database connection, circuit breaker and call latency for admins"""
+    if not is_admin(get_user_info()):
+        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+    
+    return jsonify({'success': True, 'database': db_manager.status()})
+
 def create_feature_vector(indicator, age_group, sex, race_ethnicity, education, state):
     """
     Create a one-hot encoded feature vector matching the model's expected input.
     All features start at 0, and we set the relevant ones to 1.
     """
     # Initialize all features to 0
-    features = {name: 0 for name in FEATURE_NAMES} 
+    features = {name: 0 for name in get_model().feature_names_in_}
     
     # Set default time-related features (using reasonable defaults)
     features['Year'] = 2023
@@ -609,6 +906,52 @@ def create_feature_vector(indicator, age_group, sex, race_ethnicity, education,
     
     return features
 
+def run_model(indicator, age_group, sex, race_ethnicity, education, state):
+    """Run the model for one set of inputs, returning (prediction, confidence or None)"""
+    # Create the feature vector
+    with MODEL_STAGE_SECONDS.time(stage='feature_vector'):
+        features = create_feature_vector(indicator, age_group, sex, race_ethnicity, education, state)
+    
+    # Create DataFrame with features in the correct order
+    import pandas as pd
+    model = get_model()
+    with MODEL_STAGE_SECONDS.time(stage='dataframe'):
+        df = pd.DataFrame([features], columns=model.feature_names_in_)
+    
+    # Make prediction
+    with MODEL_STAGE_SECONDS.time(stage='predict'):
+        prediction = model.predict(df)[0]
+    
+    # Get confidence interval if model supports it
+    try:
+        with MODEL_STAGE_SECONDS.time(stage='predict_proba'):
+            prediction_proba = model.predict_proba(df)[0]
+        confidence = float(max(prediction_proba)) * 100
+    except:
+        confidence = None
+    
+    return prediction, confidence
+
+# Representative inputs covering each indicator and demographic grouping
+WARMUP_INPUTS = [
+    ('Symptoms of Depressive Disorder', '18 - 29 years', None, None, None, 'United States'),
+    ('Symptoms of Anxiety Disorder', None, 'Female', None, None, 'California'),
+    ('Symptoms of Anxiety Disorder or Depressive Disorder', None, None, 'Hispanic or Latino', None, 'Texas'),
+    ('Symptoms of Depressive Disorder', None, None, None, "Bachelor's degree or higher", 'New York'),
+    ('Symptoms of Anxiety Disorder', '60 - 69 years', 'Male', None, None, 'Florida'),
+]
+
+model_warmed = False
+
+def warm_up(rounds=1):
+    """Load the model and run representative predictions so first requests skip lazy initialization"""
+    global model_warmed
+    with startup_profile.step('warm_up'):
+        for _ in range(rounds):
+            for inputs in WARMUP_INPUTS:
+                run_model(*inputs)
+    model_warmed = True
+
 @app.route('/predict', methods=['POST'])
 @login_required
 def predict():
@@ -628,21 +971,7 @@ def predict():
         employment = data.get('employment', '')  # Optional
         state = data.get('state')
         
-        # Create the feature vector
-        features = create_feature_vector(indicator, age_group, sex, race_ethnicity, education, state)
-        
-        # Create DataFrame with features in the correct order
-        df = pd.DataFrame([features], columns=FEATURE_NAMES)
-        
-        # Make prediction
-        prediction = model.predict(df)[0]
-        
-        # Get confidence interval if model supports it
-        try:
-            prediction_proba = model.predict_proba(df)[0]
-            confidence = float(max(prediction_proba)) * 100
-        except:
-            confidence = None
+        prediction, confidence = run_model(indicator, age_group, sex, race_ethnicity, education, state)
         
         # Determine condition name based on indicator
         if "Depressive Disorder" in indicator and "Anxiety" not in indicator:
@@ -669,6 +998,25 @@ def predict():
             risk_class = "high"
             recommendation = f"Your demographic group shows higher prevalence of {condition_name} symptoms. This means a significant portion of people with similar demographics experience these conditions. If you have any symptoms or concerns, we strongly recommend consulting with a mental health professional."
         
+        user_inputs = {
+            'indicator': indicator,
+            'age_group': age_group,
+            'sex': sex,
+            'race_ethnicity': race_ethnicity,
+            'education': education,
+            'disability': disability,
+            'gender_identity': gender_identity,
+            'sexual_orientation': sexual_orientation,
+            'marital_status': marital_status,
+            'employment': employment,
+            'state': state
+        }
+        
+        # Buffered only; the database write happens on the history thread
+        user_id = history_user_id(get_user_info())
+        if user_id:
+            prediction_history.record(user_id, user_inputs, float(prediction), risk_level, model_version)
+        
         return jsonify({
             'success': True,
             'prediction': float(prediction),
@@ -678,19 +1026,7 @@ def predict():
             'recommendation': recommendation,
             'condition_name': condition_name,
             'condition_display': condition_display,
-            'user_inputs': {
-                'indicator': indicator,
-                'age_group': age_group,
-                'sex': sex,
-                'race_ethnicity': race_ethnicity,
-                'education': education,
-                'disability': disability,
-                'gender_identity': gender_identity,
-                'sexual_orientation': sexual_orientation,
-                'marital_status': marital_status,
-                'employment': employment,
-                'state': state
-            }
+            'user_inputs': user_inputs
         })
     
     except Exception as e:
@@ -699,6 +1035,31 @@ def predict():
             'error': str(e)
         }), 400
 
+def generate_chatbot_reply(message, conversation):
+    """Produce the bot reply for a message and record both turns in the conversation
+    
+    Returns (bot_message, source) where source is 'watson' or 'local'.
+    """
+    # Match the message against the compiled intent catalog
+    intent = intent_matcher.match(message)
+    bot_message = None
+    source = 'local'
+    
+    # Ask Watson when enabled; crisis messages always get the local crisis resources
+    if watson_chat and not (intent and intent.name == 'crisis'):
+        bot_message = watson_chat.reply(message, conversation.context)
+        if bot_message:
+            source = 'watson'
+    
+    if not bot_message:
+        bot_message = intent.response if intent else intent_matcher.default_response
+    
+    conversation.add_turn('user', message)
+    conversation.add_turn('bot', bot_message, intent=intent.name if intent else None, source=source)
+    conversation.context['last_intent'] = intent.name if intent else None
+    conversation_store.save(conversation)
+    return bot_message, source
+
 @app.route('/chatbot/message', methods=['POST'])
 def chatbot_message():
     try:
@@ -706,72 +1067,216 @@ def chatbot_message():
         message = data.get('message', '').lower().strip()
         session_id = data.get('session_id', '')
         
-        # Create session if needed
-        if not session_id:
-            session_id = f"session_{hash(message) % 10000}"
+        # Continue the conversation, or start a new one if the id is unknown or expired
+        conversation = conversation_store.get_or_create(session_id)
+        session_id = conversation.id
         
-        # Mock mental health assistant responses
-        responses = {
-            'hello': "Hello! I'm your AI mental health assistant. I can help answer questions about mental health, explain assessment results, or provide general support. How can I help you today?",
-            'hi': "Hi there! I'm here to support you with mental health questions. What would you like to know?",
-            'help': "I can help you with:\n• Understanding your assessment results\n• General mental health information\n• Coping strategies\n• When to seek professional help\n• Mental health resources\n\nWhat specific area would you like to explore?",
-            'anxiety': "Anxiety is a normal emotion, but when it becomes persistent and overwhelming, it may indicate an anxiety disorder. Common symptoms include:\n\n• Excessive worry\n• Restlessness\n• Fatigue\n• Difficulty concentrating\n• Irritability\n• Sleep problems\n• Physical symptoms (racing heart, sweating)\n\nIf you're experiencing these symptoms frequently, consider speaking with a mental health professional.",
-            'depression': "Depression is a mood disorder that affects how you feel, think, and handle daily activities. Common symptoms include:\n\n• Persistent sadness or hopelessness\n• Loss of interest in activities\n• Changes in appetite or weight\n• Sleep disturbances\n• Fatigue or low energy\n• Difficulty concentrating\n• Feelings of worthlessness\n\nIf you're experiencing several of these symptoms for two weeks or more, please consider reaching out to a mental health professional.",
-            'stress': "Stress is a natural response to challenges, but chronic stress can impact mental health. Here are some coping strategies:\n\n• Practice deep breathing exercises\n• Engage in regular physical activity\n• Maintain a healthy sleep schedule\n• Practice mindfulness or meditation\n• Connect with supportive people\n• Set realistic goals and priorities\n• Take breaks and practice self-care\n\nRemember, it's okay to seek professional help if stress becomes overwhelming.",
-            'crisis': "If you're in immediate crisis or having thoughts of self-harm, please reach out for help right away:\n\n• National Suicide Prevention Lifeline: 988\n• Crisis Text Line: Text HOME to 741741\n• Emergency Services: 911\n• National Helpline: 1-800-662-4357\n\nYou're not alone, and help is available 24/7.",
-            'thank': "You're welcome! I'm here whenever you need support or have questions about mental health. Remember, seeking help is a sign of strength, not weakness.",
-            'bye': "Take care! Remember that mental health is important, and it's okay to reach out for support when you need it. Have a great day!",
-            'goodbye': "Goodbye! Take care of yourself and remember that seeking help for mental health is always a positive step."
-        }
-        
-        # Check for keywords and provide appropriate response
-        bot_message = None
-        for keyword, response in responses.items():
-            if keyword in message:
-                bot_message = response
-                break
-        
-        # Default response if no keyword matches
-        if not bot_message:
-            bot_message = "I'm here to help with mental health questions. I can assist with information about anxiety, depression, stress, coping strategies, or help you understand your assessment results. What would you like to know more about?"
+        bot_message, source = generate_chatbot_reply(message, conversation)
         
         return jsonify({
             'success': True,
             'message': bot_message,
-            'session_id': session_id
+            'session_id': session_id,
+            'source': source
         })
         
     except Exception as e:
-        print(f"Chatbot error: {e}")
+        logger.error(f"Chatbot error: {e}")
         return jsonify({
             'success': True,
             'message': "I'm here to help with mental health questions. How can I assist you today?",
             'session_id': session_id if 'session_id' in locals() else 'error_session'
         })
 
+# Words per Server-Sent Event when re-chunking a finished reply
+STREAM_CHUNK_WORDS = int(os.getenv('CHAT_STREAM_CHUNK_WORDS', '4'))
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chatbot/message/stream', methods=['POST'])
+def chatbot_message_stream():
+    """Send the chatbot reply as Server-Sent Events for progressive rendering
+    
+    Sends a 'meta' event with the session id straight away, then 'token' events
+    carrying successive chunks of the reply, then a final 'done' event. The
+    reply is produced in full first (Watson Assistant's message API does not
+    stream) and only then split into chunks, so the first token arrives no
+    sooner than the whole reply from /chatbot/message.
+    """
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '').lower().strip()
+    conversation = conversation_store.get_or_create(data.get('session_id', ''))
+    
+    def generate():
+        yield sse_event('meta', {'session_id': conversation.id})
+        try:
+            bot_message, source = generate_chatbot_reply(message, conversation)
+        except Exception as e:
+            logger.error(f"Chatbot error: {e}")
+            bot_message, source = "I'm here to help with mental health questions. How can I assist you today?", 'local'
+        
+        words = re.findall(r'\S+\s*', bot_message)
+        for start in range(0, len(words), STREAM_CHUNK_WORDS):
+            yield sse_event('token', {'text': ''.join(words[start:start + STREAM_CHUNK_WORDS])})
+        yield sse_event('done', {'session_id': conversation.id, 'source': source})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/chatbot/session', methods=['POST'])
 def create_chatbot_session():
-    try:
-        # Create a mock session ID
-        import time
-        session_id = f"session_{int(time.time())}"
-        
-        return jsonify({
-            'success': True,
-            'session_id': session_id
-        })
-        
-    except Exception as e:
-        print(f"Session creation error: {e}")
-        return jsonify({
-            'success': True,
-            'session_id': f"fallback_session_{hash(str(time.time())) % 10000}"
-        })
+    """Start a new chatbot conversation with a collision-free id"""
+    conversation = conversation_store.create()
+    
+    return jsonify({
+        'success': True,
+        'session_id': conversation.id
+    })
+
+@app.route('/admin/chatbot/stats')
+@login_required
+def admin_chatbot_stats():
+    """Chatbot conversation store size and eviction counts for admins"""
+    if not is_admin(get_user_info()):
+        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+    
+    return jsonify({
+        'success': True,
+        'conversations': conversation_store.stats(),
+        'watson': watson_chat.status() if watson_chat else None
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of all in-process metrics
+    
+    Scrapers send METRICS_TOKEN as a bearer token; signed-in admins may also
+    view it. Without a token configured only admins can.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization, f"Bearer {token}")
+    if not (scraper or is_admin(get_user_info())):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    
+    return Response(render_prometheus(REGISTRY), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiler', methods=['GET', 'POST'])
+@login_required
+def admin_profiler():
+    """Show the request profiler's state, or start, stop and reset it
+    
+    POST accepts JSON {"enabled": bool, "sample_rate": float, "interval": float, "reset": bool}.
+    """
+    if not is_admin(get_user_info()):
+        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if data.get('reset'):
+                request_profiler.reset()
+            if data.get('enabled') is True:
+                request_profiler.start(data.get('sample_rate'), data.get('interval'))
+            elif data.get('enabled') is False:
+                request_profiler.stop()
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f"Invalid profiler settings: {e}"}), 400
+    
+    return jsonify({'success': True, 'profiler': request_profiler.status()})
+
+@app.route('/admin/profiler/download')
+@login_required
+def admin_profiler_download():
+    """Download collapsed stacks for all routes, or one route via ?route=/predict"""
+    if not is_admin(get_user_info()):
+        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+    
+    return Response(
+        request_profiler.collapsed(request.args.get('route')),
+        mimetype='text/plain',
+        headers={'Content-Disposition': 'attachment; filename=profile.collapsed'}
+    )
+
+@app.route('/admin/startup')
+@login_required
+def admin_startup_report():
+    """Per-import and per-init-step boot time breakdown for admins"""
+    if not is_admin(get_user_info()):
+        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+    
+    return jsonify({'success': True, 'startup': startup_profile.report()})
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the model is loaded, 503 before; never waits on anything"""
+    if model_resource.loaded:
+        model_state = 'warm' if model_warmed else 'loaded'
+    else:
+        model_state = 'failed' if model_resource.error else 'loading'
+    is_ready = model_resource.loaded
+    
+    return jsonify({
+        'ready': is_ready,
+        'pid': os.getpid(),
+        'model': {'state': model_state, 'error': model_resource.error},
+        'database': {
+            'backend': db_manager.backend.name,
+            'connected': db_manager.backend.connected,
+            'breaker': db_manager.breaker.state
+        },
+        'watson_breaker': watson_chat.breaker.state if watson_chat else None,
+        'caches': {
+            'hit_ratio': {labels['cache']: round(value, 4) for labels, value in CACHE_HIT_RATIO.snapshot()},
+            'oidc_discovery_cached': appid_provider.discovery.cached,
+            'conversations': len(conversation_store),
+            'history_buffered': len(prediction_history),
+            'chat_responses': len(watson_chat.cache) if watson_chat else 0
+        },
+        'admission': admission_controller.status()
+    }), 200 if is_ready else 503
 
 @app.route('/about')
 def about():
     return render_template('about.html')
 
+def reinit_after_fork():
+    """Give a forked worker its own threads, pools and connections
+    
+    With gunicorn's preload_app the app is imported once in the master and
+    workers are forked from it. Threads do not survive fork, and sockets and
+    SQLite handles must not be shared with the parent, so each is recreated.
+    """
+    restart_logging_after_fork()
+    identity_http.reset()
+    watson_http.reset()
+    if assistant_resource.loaded and assistant_resource.get() is not None:
+        assistant_resource.get().set_http_client(watson_http.session)
+    model_resource.after_fork()
+    db_manager.after_fork()
+    if session_interface:
+        session_interface.store.after_fork()
+    if watson_chat:
+        watson_chat.after_fork()
+    conversation_store.after_fork()
+    request_profiler.after_fork()
+    prediction_history.after_fork()
+    admission_controller.after_fork()
+
+os.register_at_fork(after_in_child=reinit_after_fork)
+
+# Warm heavy subsystems in the background once the app is importable
+if os.getenv('WARM_ON_START', 'true').lower() == 'true':
+    model_resource.warm_in_background()
+
+startup_profile.mark_ready()
+startup_profile.log_report()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000, load_dotenv=False)
 
@@ -0,0 +1,66 @@
+"""
+Fingerprinted static assets
+Resolves asset names through the build manifest and serves built files with long-lived caching
+"""
+
+import os
+import json
+import logging
+import mimetypes
+from flask import url_for, send_from_directory, abort
+from build_assets import DIST_DIR, MANIFEST_NAME
+
+logger = logging.getLogger(__name__)
+
+# Built file names change with their content, so browsers may cache them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class AssetManifest:
+    """Maps source asset names to their fingerprinted build outputs"""
+
+    def __init__(self, dist_dir=DIST_DIR):
+        self.dist_dir = dist_dir
+        self.entries = {}
+        self.reload()
+
+    def reload(self):
+        path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+            logger.info(f"Loaded asset manifest with {len(self.entries)} entries")
+        except FileNotFoundError:
+            self.entries = {}
+            logger.info("No asset manifest found; serving unbuilt static files (run build_assets.py)")
+        except (OSError, ValueError) as e:
+            self.entries = {}
+            logger.warning(f"Could not read asset manifest {path}: {e}")
+
+    def url(self, name):
+        """URL of the built asset, or of the plain static file when it has not been built"""
+        built = self.entries.get(name)
+        if built:
+            return url_for('built_asset', filename=built)
+        return url_for('static', filename=name)
+
+    def send(self, filename, accept_encodings):
+        """Response for a built file, using the best precompressed variant the client accepts"""
+        if filename not in self.entries.values():
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding, suffix = None, ''
+        for candidate, candidate_suffix in ENCODINGS:
+            if accept_encodings[candidate] and os.path.exists(os.path.join(self.dist_dir, filename + candidate_suffix)):
+                encoding, suffix = candidate, candidate_suffix
+                break
+
+        response = send_from_directory(self.dist_dir, filename + suffix, mimetype=mimetype, max_age=31536000)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
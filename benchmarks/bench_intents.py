@@ -0,0 +1,72 @@
+"""
+Benchmark chatbot intent matching as the intent catalog grows
+
+Compares the compiled IntentMatcher with the previous approach of scanning a
+keyword dict with substring checks. Run from the repository root:
+
+    python benchmarks/bench_intents.py
+"""
+
+import os
+import sys
+import random
+import string
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intents import Intent, IntentMatcher  # noqa: E402
+
+CATALOG_SIZES = (10, 100, 250, 500, 1000)
+MESSAGES = [
+    "hello there",
+    "I have been feeling really anxious and stressed about work lately",
+    "can you tell me more about depression and what the symptoms look like",
+    "this is a message that matches nothing in particular at all",
+    "thanks for the help, goodbye",
+    "I think I am in crisis and need someone to talk to right now please",
+]
+
+
+def random_word(rng, length=8):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def build_catalog(size, seed=0):
+    """Real-looking intents padded with random single- and two-word keywords"""
+    rng = random.Random(seed)
+    intents = [
+        Intent('crisis', 100, ['crisis', 'kill myself'], 'crisis', order=0),
+        Intent('depression', 50, ['depression', 'depressed'], 'depression', order=1),
+        Intent('anxiety', 50, ['anxiety', 'anxious'], 'anxiety', order=2),
+        Intent('hello', 10, ['hello', 'hi'], 'hello', order=3),
+    ]
+    for index in range(len(intents), size):
+        keywords = [random_word(rng) for _ in range(3)] + [f"{random_word(rng)} {random_word(rng)}"]
+        intents.append(Intent(f"intent_{index}", rng.randint(1, 90), keywords, 'response', order=index))
+    return intents
+
+
+def naive_respond(responses, message):
+    """The original approach: first keyword found as a substring wins"""
+    for keyword, response in responses.items():
+        if keyword in message:
+            return response
+    return None
+
+
+def main(number=2000):
+    print(f"{'intents':>8} {'keywords':>9} {'compiled us/msg':>16} {'naive us/msg':>13}")
+    for size in CATALOG_SIZES:
+        intents = build_catalog(size)
+        matcher = IntentMatcher(intents, 'default')
+        responses = {keyword: intent.response for intent in intents for keyword in intent.keywords}
+
+        compiled = timeit.timeit(lambda: [matcher.respond(m) for m in MESSAGES], number=number)
+        naive = timeit.timeit(lambda: [naive_respond(responses, m.lower()) for m in MESSAGES], number=number)
+        per_message = 1e6 / (number * len(MESSAGES))
+        print(f"{size:>8} {len(responses):>9} {compiled * per_message:>16.2f} {naive * per_message:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+"""
+End-to-end load test against a locally started app
+
+Starts stub servers for Google OAuth, App ID and Cloudant, then, for each
+gunicorn worker/thread configuration, boots the app under gunicorn, drives
+weighted user journeys from concurrent virtual users and reports throughput,
+error rate and latency percentiles. Run from the repository root:
+
+    python benchmarks/loadtest.py --configs 1x1,2x4,4x8 --users 32 --duration 30
+
+Configurations are WORKERSxTHREADS. Use --json to save the full results,
+including per-step latencies, and --stub-delay to add latency to every stub
+call (e.g. 0.05 to mimic real identity and database round trips).
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+from stubs import cloudant_stub, identity_stub  # noqa: E402
+
+PREDICT_CHOICES = {
+    'indicator': ['Symptoms of Depressive Disorder', 'Symptoms of Anxiety Disorder',
+                  'Symptoms of Anxiety Disorder or Depressive Disorder'],
+    'age_group': ['18 - 29 years', '30 - 39 years', '40 - 49 years', '50 - 59 years',
+                  '60 - 69 years', '70 - 79 years', '80 years and above'],
+    'sex': ['Male', 'Female'],
+    'race_ethnicity': ['Hispanic or Latino', 'Non-Hispanic White, single race',
+                       'Non-Hispanic Black, single race', 'Non-Hispanic Asian, single race'],
+    'education': ['Less than a high school diploma', 'High school diploma or GED',
+                  "Some college/Associate's degree", "Bachelor's degree or higher"],
+    'state': ['California', 'Texas', 'New York', 'Florida', 'Ohio', 'United States']
+}
+CHAT_MESSAGES = [
+    'hello', 'I feel anxious about work', 'what is depression', 'I am so stressed lately',
+    'can you help me', 'thanks for the help', 'tell me something nice', 'goodbye'
+]
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Thread-safe collection of (step, latency, ok) samples"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, step, seconds, ok):
+        with self.lock:
+            self.samples[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+
+
+class VirtualUser:
+    """One browser-like client with its own cookie jar"""
+
+    def __init__(self, base_url, recorder, rng, keepalive=True):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+        self.http = requests.Session()
+        if not keepalive:
+            # A new connection per request lets any worker answer, as behind a load balancer
+            self.http.headers['Connection'] = 'close'
+        self.email = None
+
+    def step(self, name, method, path, expect=None, **kwargs):
+        """Send one request; ``expect`` checks the response and returns False on failure"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=30, **kwargs)
+            ok = response.status_code < 400 and (expect is None or expect(response))
+            return response
+        except requests.RequestException:
+            response = None
+        finally:
+            self.recorder.record(name, time.perf_counter() - start, ok)
+            if not ok:
+                raise JourneyFailed(name)
+
+    def logged_in(self, response):
+        return response.url.endswith('/loading')
+
+    def reset(self):
+        self.http.cookies.clear()
+
+    # Journeys
+
+    def signup_and_predict(self):
+        self.email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        self.step('GET /email/signup', 'GET', '/email/signup')
+        self.step('POST /email/signup', 'POST', '/email/signup', expect=self.logged_in, data={
+            'first_name': 'Load', 'last_name': 'Tester', 'email': self.email,
+            'password': 'loadtest123', 'confirm_password': 'loadtest123', 'terms': 'on'
+        })
+        self.predict(self.rng.randint(1, 3))
+        self.step('GET /logout', 'GET', '/logout')
+
+    def login_and_predict(self):
+        email = self.email or f"load-{uuid.uuid4().hex[:12]}@example.com"
+        self.step('POST /email/login', 'POST', '/email/login', expect=self.logged_in,
+                  data={'email': email, 'password': 'loadtest123'})
+        self.step('GET /', 'GET', '/')
+        self.predict(self.rng.randint(1, 3))
+        self.step('GET /logout', 'GET', '/logout')
+
+    def predict(self, times):
+        for _ in range(times):
+            payload = {field: self.rng.choice(values) for field, values in PREDICT_CHOICES.items()}
+            self.step('POST /predict', 'POST', '/predict', json=payload,
+                      expect=lambda r: r.json().get('success') is True)
+
+    def chatbot(self):
+        response = self.step('POST /chatbot/session', 'POST', '/chatbot/session')
+        session_id = response.json()['session_id']
+        for _ in range(self.rng.randint(2, 5)):
+            self.step('POST /chatbot/message', 'POST', '/chatbot/message',
+                      json={'message': self.rng.choice(CHAT_MESSAGES), 'session_id': session_id},
+                      expect=lambda r: r.json().get('session_id') == session_id)
+
+    def google_login(self):
+        code = f"google{self.rng.randint(1, 500)}"
+        self.step('POST /google/auth/callback', 'POST', '/google/auth/callback', json={'code': code},
+                  expect=lambda r: r.json().get('success') is True)
+        self.step('GET /profile', 'GET', '/profile')
+        self.step('GET /logout', 'GET', '/logout')
+
+    def appid_login(self):
+        # Follows the redirects through the stub's authorization endpoint back to /auth/callback
+        self.step('GET /login?provider=ibm', 'GET', '/login?provider=ibm', expect=self.logged_in)
+        self.step('GET /profile', 'GET', '/profile')
+        self.step('GET /logout', 'GET', '/logout')
+
+    def admin(self):
+        self.step('POST /email/login (admin)', 'POST', '/email/login', expect=self.logged_in,
+                  data={'email': 'loadtest@admin.com', 'password': 'loadtest123'})
+        self.step('GET /admin/dashboard', 'GET', '/admin/dashboard',
+                  expect=lambda r: r.url.endswith('/admin/dashboard'))
+        self.step('GET /admin/chatbot/stats', 'GET', '/admin/chatbot/stats')
+        self.step('GET /logout', 'GET', '/logout')
+
+
+JOURNEYS = (
+    ('signup_and_predict', 25),
+    ('login_and_predict', 20),
+    ('chatbot', 35),
+    ('google_login', 8),
+    ('appid_login', 8),
+    ('admin', 4),
+)
+
+
+def run_users(base_url, users, duration, seed=0, keepalive=True):
+    """Drive ``users`` virtual users for ``duration`` seconds and return the Recorder"""
+    recorder = Recorder()
+    journey_counts = defaultdict(int)
+    deadline = time.monotonic() + duration
+    names, weights = zip(*JOURNEYS)
+
+    def loop(index):
+        rng = random.Random(seed + index)
+        user = VirtualUser(base_url, recorder, rng, keepalive)
+        while time.monotonic() < deadline:
+            journey = rng.choices(names, weights)[0]
+            try:
+                getattr(user, journey)()
+                journey_counts[journey] += 1
+            except JourneyFailed:
+                user.reset()
+
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, dict(journey_counts)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, errors, duration):
+    latencies = sorted(samples)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'throughput': count / duration,
+        'error_rate': errors / count if count else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url, timeout=90):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def app_environment(port, identity_url, cloudant_url, workdir, database, rate_limit=False):
+    env = dict(os.environ)
+    env.update({
+        'SECRET_KEY': 'loadtest-secret',
+        'LOG_LEVEL': 'WARNING',
+        # Workers must share sessions, or a login on one is unknown to the others
+        'SESSION_BACKEND': 'sqlite',
+        'SESSION_SQLITE_PATH': os.path.join(workdir, f"sessions-{port}.db"),
+        'CHAT_STORE': 'sqlite',
+        'CHAT_SQLITE_PATH': os.path.join(workdir, f"conversations-{port}.db"),
+        'GOOGLE_TOKEN_URL': f"{identity_url}/google/token",
+        'GOOGLE_USERINFO_URL': f"{identity_url}/google/userinfo",
+        'APPID_DISCOVERY_ENDPOINT': f"{identity_url}/appid/.well-known/openid-configuration",
+        'APPID_CLIENT_ID': 'loadtest-client',
+        'APPID_CLIENT_SECRET': 'loadtest-secret',
+        'APPID_REDIRECT_URI': f"http://127.0.0.1:{port}/auth/callback",
+        'CHATBOT_BACKEND': 'local',
+        # Every virtual user signs in from 127.0.0.1, so per-IP budgets would throttle
+        # the login journeys; measure raw capacity unless asked otherwise
+        'RATE_LIMIT_ENABLED': 'true' if rate_limit else 'false'
+    })
+    if database == 'cloudant':
+        env.update({
+            'DATABASE_BACKEND': 'cloudant',
+            'CLOUDANT_URL': cloudant_url,
+            'CLOUDANT_USERNAME': 'loadtest',
+            'CLOUDANT_APIKEY': 'loadtest',
+            'IAM_TOKEN_URL': f"{cloudant_url}/identity/token"
+        })
+    else:
+        env.update({'DATABASE_BACKEND': 'sqlite', 'SQLITE_PATH': os.path.join(workdir, f"app-{port}.db")})
+    return env
+
+
+def run_configuration(workers, threads, args, identity_url, cloudant_url, workdir):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [
+        sys.executable, '-m', 'gunicorn', 'app:app',
+        '--bind', f"127.0.0.1:{port}",
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--timeout', '60',
+        '--log-level', 'warning'
+    ]
+    env = app_environment(port, identity_url, cloudant_url, workdir, args.database, args.rate_limit)
+    log_path = os.path.join(workdir, f"gunicorn-{workers}x{threads}.log")
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_until_up(base_url):
+            raise RuntimeError(f"App did not start for {workers}x{threads}; see {log_path}")
+        # One warm-up pass so model loading and first connections are not measured
+        run_users(base_url, min(args.users, workers * threads), args.warmup, seed=10_000, keepalive=args.keepalive)
+
+        started = time.monotonic()
+        recorder, journeys = run_users(base_url, args.users, args.duration, seed=args.seed, keepalive=args.keepalive)
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    result = {
+        'workers': workers,
+        'threads': threads,
+        'users': args.users,
+        'duration': elapsed,
+        'journeys': journeys,
+        'overall': summarize(all_samples, sum(recorder.errors.values()), elapsed),
+        'steps': {
+            step: summarize(samples, recorder.errors[step], elapsed)
+            for step, samples in sorted(recorder.samples.items())
+        }
+    }
+    return result
+
+
+def print_table(results):
+    header = f"{'config':>8} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        o = result['overall']
+        config = f"{result['workers']}x{result['threads']}"
+        print(f"{config:>8} {o['requests']:>9} {o['throughput']:>8.1f} {o['error_rate']:>6.1%} "
+              f"{o['p50_ms']:>8.1f} {o['p95_ms']:>8.1f} {o['p99_ms']:>8.1f}")
+
+
+def print_steps(result):
+    print(f"\n{result['workers']}x{result['threads']} by step:")
+    for step, s in result['steps'].items():
+        print(f"  {step:<32} {s['requests']:>7} {s['error_rate']:>6.1%} "
+              f"p50 {s['p50_ms']:>7.1f}  p95 {s['p95_ms']:>7.1f}  p99 {s['p99_ms']:>7.1f}")
+
+
+def parse_configs(text):
+    configs = []
+    for item in text.split(','):
+        workers, _, threads = item.strip().lower().partition('x')
+        configs.append((int(workers), int(threads or 1)))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--configs', default='1x1,1x4,2x4,4x4', help='comma-separated WORKERSxTHREADS list')
+    parser.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds per configuration')
+    parser.add_argument('--warmup', type=float, default=3.0, help='unmeasured seconds before each run')
+    parser.add_argument('--database', choices=('cloudant', 'sqlite'), default='cloudant',
+                        help='cloudant uses the Cloudant stub; sqlite uses a local file')
+    parser.add_argument('--stub-delay', type=float, default=0.0, help='seconds added to every stub response')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-keepalive', dest='keepalive', action='store_false',
+                        help='open a connection per request so consecutive requests reach different workers')
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='keep admission control on; refused requests count as errors')
+    parser.add_argument('--steps', action='store_true', help='also print per-step latencies')
+    parser.add_argument('--json', help='write full results to this file')
+    args = parser.parse_args()
+
+    identity = identity_stub.serve(delay=args.stub_delay)
+    cloudant = cloudant_stub.serve(delay=args.stub_delay)
+    identity_url = f"http://127.0.0.1:{identity.server_port}"
+    cloudant_url = f"http://127.0.0.1:{cloudant.server_port}"
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+        for workers, threads in parse_configs(args.configs):
+            print(f"Running {workers} worker(s) x {threads} thread(s) with {args.users} users "
+                  f"for {args.duration:.0f}s...", flush=True)
+            results.append(run_configuration(workers, threads, args, identity_url, cloudant_url, workdir))
+
+    print()
+    print_table(results)
+    if args.steps:
+        for result in results:
+            print_steps(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Static asset build
+Minifies, fingerprints and precompresses static assets into static/dist
+
+    python build_assets.py
+
+Writes name.<hash>.ext for each asset, gzip (and brotli, if installed)
+variants next to it, and manifest.json mapping source names to built names.
+rjsmin and rcssmin are used for minification when installed; otherwise a
+conservative built-in pass strips only comments and whitespace.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+ASSETS = ('style.css', 'script.js')
+
+# Quoted strings are matched first in each pattern so their contents pass through untouched
+CSS_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+CSS_SPACE = re.compile(rf'({CSS_STRING})|/\*.*?\*/|\s+', re.S)
+CSS_PUNCTUATION = re.compile(rf'({CSS_STRING})|\s*([{{}};,])\s*')
+CSS_LAST_SEMICOLON = re.compile(rf'({CSS_STRING})|;(\}})')
+JS_LINE_COMMENT = re.compile(r'^\s*//')
+BACKTICK = re.compile(r'(?<!\\)`')
+
+
+def minify_css(source):
+    try:
+        from rcssmin import cssmin
+        return cssmin(source)
+    except ImportError:
+        pass
+
+    # Comments and whitespace runs become one space, then space around punctuation goes
+    css = CSS_SPACE.sub(lambda m: m.group(1) or ' ', source)
+    css = CSS_PUNCTUATION.sub(lambda m: m.group(1) or m.group(2), css)
+    css = CSS_LAST_SEMICOLON.sub(lambda m: m.group(1) or m.group(2), css)
+    return css.strip()
+
+
+def minify_js(source):
+    try:
+        from rjsmin import jsmin
+        return jsmin(source)
+    except ImportError:
+        pass
+
+    # Only whole-line comments, blank lines and indentation outside template literals are removed
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line)
+        elif line.strip() and not JS_LINE_COMMENT.match(line):
+            lines.append(line.strip())
+        if len(BACKTICK.findall(line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def fingerprint(content):
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def compress_variants(path, content):
+    """Write .gz and .br next to ``path`` when they are smaller than the original"""
+    written = []
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gz) < len(content):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gz)
+        written.append(('gzip', len(gz)))
+    try:
+        import brotli
+    except ImportError:
+        return written
+    br = brotli.compress(content, quality=11)
+    if len(br) < len(content):
+        with open(path + '.br', 'wb') as f:
+            f.write(br)
+        written.append(('br', len(br)))
+    return written
+
+
+def build(assets=ASSETS, static_dir=STATIC_DIR, dist_dir=DIST_DIR, quiet=False):
+    """Build every asset and return the manifest"""
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    for name in assets:
+        with open(os.path.join(static_dir, name), encoding='utf-8') as f:
+            source = f.read()
+        stem, ext = os.path.splitext(name)
+        minify = MINIFIERS.get(ext, lambda text: text)
+        content = minify(source).encode('utf-8')
+        built = f"{stem}.{fingerprint(content)}{ext}"
+        path = os.path.join(dist_dir, built)
+        with open(path, 'wb') as f:
+            f.write(content)
+        manifest[name] = built
+        variants = compress_variants(path, content)
+        if not quiet:
+            sizes = ', '.join(f"{encoding} {size:,}" for encoding, size in variants)
+            print(f"{name}: {len(source.encode('utf-8')):,} -> {len(content):,} bytes ({sizes}) as {built}")
+
+    # Drop outputs of earlier builds so dist only holds what the manifest names
+    keep = {MANIFEST_NAME} | {f"{built}{suffix}" for built in manifest.values() for suffix in ('', '.gz', '.br')}
+    for existing in os.listdir(dist_dir):
+        if existing not in keep:
+            os.remove(os.path.join(dist_dir, existing))
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+    build(quiet=args.quiet)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
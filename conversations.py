@@ -0,0 +1,296 @@
+"""
+Chatbot conversation store
+Bounded LRU+TTL store of per-session conversation state
+"""
+
+import time
+import atexit
+import secrets
+import threading
+import logging
+from collections import OrderedDict, deque
+from metrics import REGISTRY, CACHE_LOOKUPS, register_cache
+from session_store import SQLiteSessionStore
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_EVICTIONS = REGISTRY.counter(
+    'chat_conversation_evictions_total', 'Chatbot conversations evicted from memory', ('reason',)
+)
+register_cache('chat_conversation')
+CONVERSATIONS_ACTIVE = REGISTRY.gauge('chat_conversations_active', 'Chatbot conversations held in memory')
+CONVERSATION_WRITES = REGISTRY.counter(
+    'chat_conversation_writes_total', 'Evicted chatbot conversations written to the database', ('outcome',)
+)
+
+# Longest message kept in a conversation's history
+MAX_TEXT_LENGTH = 2000
+
+# Evicted conversations written per bulk request
+WRITE_BATCH_SIZE = 100
+
+
+class Conversation:
+    """Recent turns and free-form context for one chatbot session"""
+
+    __slots__ = ('id', 'created_at', 'updated_at', 'turns', 'context', 'rev')
+
+    def __init__(self, conversation_id, max_turns, created_at=None, turns=(), context=None, rev=None):
+        now = time.time()
+        self.id = conversation_id
+        self.created_at = created_at or now
+        self.updated_at = now
+        self.turns = deque(turns, maxlen=max_turns)
+        self.context = context or {}
+        # Revision of the stored copy, needed to overwrite it
+        self.rev = rev
+
+    def add_turn(self, role, text, **extra):
+        turn = {'role': role, 'text': text[:MAX_TEXT_LENGTH], 'at': time.time()}
+        turn.update(extra)
+        self.turns.append(turn)
+        self.updated_at = turn['at']
+
+    def to_state(self):
+        return {'created_at': self.created_at, 'turns': list(self.turns), 'context': self.context}
+
+    def to_doc(self, expires_at):
+        doc = {
+            '_id': f"conversation:{self.id}",
+            'type': 'conversation',
+            'created_at': self.created_at,
+            'expires_at': expires_at,
+            'turns': list(self.turns),
+            'context': self.context
+        }
+        if self.rev:
+            doc['_rev'] = self.rev
+        return doc
+
+
+class ConversationStore:
+    """Memory-bounded store of chatbot conversations
+
+    Holds at most ``max_sessions`` conversations of at most ``max_turns`` turns
+    each. Conversations idle for longer than ``ttl`` seconds expire, and the
+    least recently used one is evicted when the store is full. If ``db`` (a
+    DatabaseManager) is given, conversations evicted for capacity are handed to
+    a background writer that saves them in batches, and are reloaded on their
+    next use; requests never wait on those writes.
+
+    With several worker processes, pass ``shared`` (a SessionStore, normally
+    from shared_conversation_store) instead. Conversations are then read
+    from it on every lookup and written through on every change, so any
+    worker can continue any conversation; the store's own expiry replaces
+    the in-process LRU.
+    """
+
+    def __init__(self, max_sessions=5000, ttl=1800, max_turns=20, sweep_interval=60, db=None, shared=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.sweep_interval = sweep_interval
+        self.db = db if shared is None else None
+        self.shared = shared
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        # Evicted conversations waiting for the writer, by id
+        self._outbox = OrderedDict()
+        self._wake = threading.Event()
+        self._writer = None
+        CONVERSATIONS_ACTIVE.set_function(lambda: len(self._conversations))
+        if self.db is not None:
+            atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._conversations)
+
+    @staticmethod
+    def new_id():
+        """Random URL-safe id; 128 bits make collisions practically impossible"""
+        return f"chat_{secrets.token_urlsafe(16)}"
+
+    def create(self):
+        """Start a new conversation and return it"""
+        conversation = Conversation(self.new_id(), self.max_turns)
+        if self.shared is not None:
+            self.save(conversation)
+        else:
+            self._put(conversation)
+        return conversation
+
+    def save(self, conversation):
+        """Record changes made to a conversation
+
+        Only the shared store needs this; in process the object is the stored state.
+        """
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(f"conversation:{conversation.id}", conversation.to_state(), self.ttl)
+        except Exception as e:
+            logger.error(f"Error saving conversation {conversation.id}: {e}")
+
+    def get(self, conversation_id):
+        """Return a live conversation, or None if unknown or expired"""
+        if not conversation_id:
+            return None
+        if self.shared is not None:
+            return self._get_shared(conversation_id)
+        now = time.time()
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                if now - conversation.updated_at < self.ttl:
+                    self._conversations.move_to_end(conversation_id)
+                    CACHE_LOOKUPS.inc(cache='chat_conversation', result='hit')
+                    return conversation
+                del self._conversations[conversation_id]
+                CONVERSATION_EVICTIONS.inc(reason='expired')
+        conversation = self._load(conversation_id)
+        CACHE_LOOKUPS.inc(cache='chat_conversation', result='restored' if conversation else 'miss')
+        if conversation:
+            self._put(conversation)
+        return conversation
+
+    def _get_shared(self, conversation_id):
+        try:
+            found = self.shared.get(f"conversation:{conversation_id}")
+        except Exception as e:
+            logger.error(f"Error loading conversation {conversation_id}: {e}")
+            found = None
+        CACHE_LOOKUPS.inc(cache='chat_conversation', result='hit' if found else 'miss')
+        if found is None:
+            return None
+        state, _ = found
+        return Conversation(
+            conversation_id,
+            self.max_turns,
+            created_at=state.get('created_at'),
+            turns=state.get('turns', []),
+            context=state.get('context', {})
+        )
+
+    def get_or_create(self, conversation_id):
+        """Return the conversation for ``conversation_id``, starting a new one if needed"""
+        return self.get(conversation_id) or self.create()
+
+    def _put(self, conversation):
+        evicted = []
+        with self._lock:
+            self._conversations[conversation.id] = conversation
+            self._conversations.move_to_end(conversation.id)
+            while len(self._conversations) > self.max_sessions:
+                _, oldest = self._conversations.popitem(last=False)
+                evicted.append(oldest)
+        if evicted:
+            CONVERSATION_EVICTIONS.inc(len(evicted), reason='capacity')
+            self._persist(evicted)
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.evict_expired()
+
+    def evict_expired(self):
+        """Drop every conversation idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            expired = [cid for cid, conv in self._conversations.items() if conv.updated_at <= cutoff]
+            for cid in expired:
+                del self._conversations[cid]
+        if expired:
+            CONVERSATION_EVICTIONS.inc(len(expired), reason='expired')
+        return len(expired)
+
+    def _persist(self, conversations):
+        """Queue evicted conversations for the background writer"""
+        if self.db is None:
+            return
+        dropped = 0
+        with self._lock:
+            for conv in conversations:
+                self._outbox[conv.id] = conv
+            # A stalled database must not let the outbox outgrow the store itself
+            while len(self._outbox) > self.max_sessions:
+                self._outbox.popitem(last=False)
+                dropped += 1
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='conversation-writer', daemon=True)
+                self._writer.start()
+        if dropped:
+            CONVERSATION_WRITES.inc(dropped, outcome='dropped')
+        self._wake.set()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing evicted conversations: {e}")
+
+    def flush(self):
+        """Write every queued conversation, in batches; failed writes are dropped"""
+        while True:
+            with self._lock:
+                batch = list(self._outbox.values())[:WRITE_BATCH_SIZE]
+            if not batch:
+                return
+            saved = self.db.save_documents([conv.to_doc(conv.updated_at + self.ttl) for conv in batch])
+            revs = {doc['_id']: doc.get('_rev') for doc in saved}
+            with self._lock:
+                for conv in batch:
+                    conv.rev = revs.get(f"conversation:{conv.id}", conv.rev)
+                    if self._outbox.get(conv.id) is conv:
+                        del self._outbox[conv.id]
+            CONVERSATION_WRITES.inc(len(revs), outcome='saved')
+            if len(batch) > len(revs):
+                CONVERSATION_WRITES.inc(len(batch) - len(revs), outcome='failed')
+
+    def after_fork(self):
+        """Drop the parent's lock, queue and writer thread in a forked worker"""
+        self._lock = threading.Lock()
+        self._outbox = OrderedDict()
+        self._wake = threading.Event()
+        self._writer = None
+        if self.shared is not None:
+            self.shared.after_fork()
+
+    def _load(self, conversation_id):
+        if self.db is None:
+            return None
+        # Evicted but not yet written
+        with self._lock:
+            pending = self._outbox.pop(conversation_id, None)
+        if pending is not None:
+            return pending
+        doc = self.db.get_document(f"conversation:{conversation_id}")
+        if not doc or doc.get('expires_at', 0) <= time.time():
+            return None
+        return Conversation(
+            conversation_id,
+            self.max_turns,
+            created_at=doc.get('created_at'),
+            turns=doc.get('turns', []),
+            context=doc.get('context', {}),
+            rev=doc.get('_rev')
+        )
+
+    def stats(self):
+        return {
+            'backend': 'shared' if self.shared is not None else 'memory',
+            'active': len(self._conversations),
+            'max_sessions': self.max_sessions,
+            'ttl': self.ttl,
+            'evictions': {labels['reason']: value for labels, value in CONVERSATION_EVICTIONS.snapshot()},
+            'lookups': {
+                labels['result']: value for labels, value in CACHE_LOOKUPS.snapshot()
+                if labels['cache'] == 'chat_conversation'
+            }
+        }
+
+
+def shared_conversation_store(path):
+    """SQLite store that lets every worker process on the box see every conversation"""
+    return SQLiteSessionStore(path, evictions=CONVERSATION_EVICTIONS)
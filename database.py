@@ -1,59 +1,138 @@
 """
 Database module for Cloudant integration
-Handles user data storage and retrieval
+Handles user data storage and retrieval through a pluggable storage backend
 """
 
-import os
 from datetime import datetime
-from cloudant import Cloudant
-from cloudant.error import CloudantException
+from storage import create_storage_backend
+from resilience import CircuitBreaker, TimeoutExecutor
+from metrics import REGISTRY
+import os
+import time
+import threading
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DB_CALL_SECONDS = REGISTRY.histogram(
+    'db_call_seconds', 'Latency of DatabaseManager storage calls', ('operation', 'outcome')
+)
+
 class DatabaseManager:
-    def __init__(self):
-        """Initialize Cloudant database connection"""
-        self.client = None
-        self.db = None
-        self.connect()
+    def __init__(self, backend=None):
+        """Set up the storage backend selected by DATABASE_BACKEND without connecting
+
+        The connection is established lazily in a background thread on first use,
+        so importing this module never blocks on the network.
+        """
+        self.backend = backend or create_storage_backend()
+        self.call_timeout = float(os.getenv('DB_CALL_TIMEOUT', '5'))
+        self.connect_retries = int(os.getenv('DB_CONNECT_RETRIES', '5'))
+        self.breaker = CircuitBreaker(
+            'database',
+            failure_threshold=int(os.getenv('DB_BREAKER_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('DB_BREAKER_RESET', '30'))
+        )
+        self._executor = TimeoutExecutor('db-call', max_workers=int(os.getenv('DB_MAX_WORKERS', '8')))
+        self._connect_thread = None
+        self._connect_lock = threading.Lock()
+    
+    @property
+    def db(self):
+        """The storage backend when it is connected and the circuit allows calls"""
+        if not self.backend.connected:
+            self.start()
+            if not self.backend.connected:
+                return None
+        if not self.breaker.allow_request():
+            return None
+        return self.backend
+    
+    def start(self):
+        """Start connecting in the background if not already connected or connecting"""
+        if self.backend.connected or not self.backend.configured:
+            return
+        if not self.backend.remote:
+            # Local engines open instantly, so connect inline
+            with self._connect_lock:
+                if not self.backend.connected:
+                    self.connect()
+            return
+        with self._connect_lock:
+            if self._connect_thread is not None and self._connect_thread.is_alive():
+                return
+            if self._connect_thread is not None and not self.breaker.allow_request():
+                return
+            self._connect_thread = threading.Thread(
+                target=self._connect_with_retries, name='db-connect', daemon=True
+            )
+            self._connect_thread.start()
+    
+    def _connect_with_retries(self):
+        """Try to connect with exponential backoff, opening the circuit if all attempts fail"""
+        delay = 1.0
+        for attempt in range(1, self.connect_retries + 1):
+            if self.connect():
+                self.breaker.record_success()
+                return
+            logger.warning(f"Database connection attempt {attempt}/{self.connect_retries} failed")
+            if attempt < self.connect_retries:
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        self.breaker.trip()
+        logger.error("Database unavailable. Running in session-only mode.")
     
     def connect(self):
-        """Connect to Cloudant database"""
+        """Connect to the configured storage backend"""
         try:
-            # Get Cloudant credentials from environment
-            api_key = os.getenv('CLOUDANT_APIKEY')
-            host = os.getenv('CLOUDANT_HOST')
-            username = os.getenv('CLOUDANT_USERNAME')
-            
-            if not all([api_key, host, username]):
-                logger.warning("Cloudant credentials not found. Database operations will be disabled.")
-                return False
-            
-            # Connect to Cloudant
-            self.client = Cloudant.iam(username, api_key, url=f"https://{host}")
-            self.client.connect()
-            
-            # Get or create database
-            db_name = "mental_health_users"
-            if db_name in self.client.all_dbs():
-                self.db = self.client[db_name]
-            else:
-                self.db = self.client.create_database(db_name)
-                logger.info(f"Created database: {db_name}")
-            
-            logger.info("Successfully connected to Cloudant database")
-            return True
-            
-        except CloudantException as e:
-            logger.error(f"Cloudant connection failed: {e}")
-            return False
+            return self.backend.connect()
         except Exception as e:
             logger.error(f"Database connection error: {e}")
             return False
     
+    def _call(self, operation, fn, *args, **kwargs):
+        """Run a storage call with a timeout, recording latency and breaker state"""
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            if self.backend.remote and self.call_timeout > 0:
+                result = self._executor.call(self.call_timeout, fn, *args, **kwargs)
+            else:
+                result = fn(*args, **kwargs)
+            self.breaker.record_success()
+            return result
+        except TimeoutError:
+            outcome = 'timeout'
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            outcome = 'error'
+            self.breaker.record_failure()
+            raise
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - start, operation=operation, outcome=outcome)
+    
+    def after_fork(self):
+        """Start over in a forked worker: fresh call pool, connections and connect thread"""
+        self._executor.after_fork()
+        self._connect_lock = threading.Lock()
+        self._connect_thread = None
+        self.backend.after_fork()
+        self.start()
+    
+    def status(self):
+        """Connection, circuit breaker and latency summary for monitoring"""
+        return {
+            'backend': self.backend.name,
+            'configured': self.backend.configured,
+            'connected': self.backend.connected,
+            'connecting': bool(self._connect_thread and self._connect_thread.is_alive()),
+            'breaker': self.breaker.snapshot(),
+            'latency': DB_CALL_SECONDS.snapshot()
+        }
+    
     def save_user(self, user_data):
         """Save user data to database"""
         if not self.db:
@@ -92,13 +171,10 @@ class DatabaseManager:
                 user_doc["login_history"] = existing_user.get("login_history", []) + user_doc["login_history"]
             
             # Save to database
-            doc = self.db.create_document(user_doc)
+            doc = self._call('save_user', self.backend.save, user_doc)
             logger.info(f"User saved successfully: {user_doc['_id']}")
             return doc
             
-        except CloudantException as e:
-            logger.error(f"Failed to save user: {e}")
-            return None
         except Exception as e:
             logger.error(f"Error saving user: {e}")
             return None
@@ -110,14 +186,10 @@ class DatabaseManager:
             return None
         
         try:
-            doc = self.db[user_id]
+            doc = self._call('get_user', self.backend.get, user_id)
+            if doc is None:
+                logger.info(f"User not found: {user_id}")
             return doc
-        except KeyError:
-            logger.info(f"User not found: {user_id}")
-            return None
-        except CloudantException as e:
-            logger.error(f"Failed to get user: {e}")
-            return None
         except Exception as e:
             logger.error(f"Error getting user: {e}")
             return None
@@ -153,13 +225,10 @@ class DatabaseManager:
                 user["login_history"] = user["login_history"][-50:]
             
             # Save updated user
-            user.save()
+            user = self._call('update_user_login', self.backend.save, user)
             logger.info(f"User login updated: {user_id}")
             return user
             
-        except CloudantException as e:
-            logger.error(f"Failed to update user login: {e}")
-            return None
         except Exception as e:
             logger.error(f"Error updating user login: {e}")
             return None
@@ -171,26 +240,9 @@ class DatabaseManager:
             return None
         
         try:
-            # Create index if it doesn't exist
-            if 'email_index' not in [idx['name'] for idx in self.db.indexes()]:
-                self.db.create_index({
-                    'index': {'fields': ['email']},
-                    'name': 'email_index',
-                    'type': 'json'
-                })
-            
-            # Query by email
-            selector = {'email': email}
-            result = self.db.get_query_result(selector, fields=['_id', 'email', 'name', 'provider'])
-            
-            for row in result:
-                return self.get_user(row['_id'])
+            # Query by email (indexed by every backend)
+            return self._call('get_user_by_email', self.backend.find_by_email, email)
             
-            return None
-            
-        except CloudantException as e:
-            logger.error(f"Failed to search user by email: {e}")
-            return None
         except Exception as e:
             logger.error(f"Error searching user by email: {e}")
             return None
@@ -202,13 +254,8 @@ class DatabaseManager:
             return []
         
         try:
-            selector = {'type': 'user'}
-            result = self.db.get_query_result(selector, limit=limit)
-            return [row for row in result]
+            return self._call('get_all_users', self.backend.find_by_type, 'user', limit=limit)
             
-        except CloudantException as e:
-            logger.error(f"Failed to get all users: {e}")
-            return []
         except Exception as e:
             logger.error(f"Error getting all users: {e}")
             return []
@@ -220,16 +267,11 @@ class DatabaseManager:
             return False
         
         try:
-            user = self.get_user(user_id)
-            if user:
-                user.delete()
+            if self._call('delete_user', self.backend.delete, user_id):
                 logger.info(f"User deleted: {user_id}")
                 return True
             return False
             
-        except CloudantException as e:
-            logger.error(f"Failed to delete user: {e}")
-            return False
         except Exception as e:
             logger.error(f"Error deleting user: {e}")
             return False
@@ -278,10 +320,51 @@ class DatabaseManager:
             logger.error(f"Error getting user stats: {e}")
             return {}
     
+    def get_document(self, doc_id):
+        """Get any document by ID"""
+        if not self.db:
+            return None
+        
+        try:
+            return self._call('get_document', self.backend.get, doc_id)
+            
+        except Exception as e:
+            logger.error(f"Error getting document: {e}")
+            return None
+    
+    def get_documents_by_prefix(self, prefix, limit=20, before=None):
+        """Documents whose id starts with ``prefix``, newest (highest id) first"""
+        if not self.db:
+            return []
+        
+        try:
+            return self._call('get_documents_by_prefix', self.backend.find_by_id_prefix, prefix, limit, before)
+            
+        except Exception as e:
+            logger.error(f"Error listing documents: {e}")
+            return []
+    
+    def save_documents(self, docs):
+        """Save several documents in a single batched write"""
+        if not self.db:
+            logger.warning("Database not connected. Cannot save documents.")
+            return []
+        
+        if not docs:
+            return []
+        
+        try:
+            return self._call('save_documents', self.backend.save_many, docs)
+            
+        except Exception as e:
+            logger.error(f"Error saving documents: {e}")
+            return []
+    
     def close(self):
         """Close database connection"""
-        if self.client:
-            self.client.disconnect()
+        self._executor.shutdown()
+        if self.backend.connected:
+            self.backend.close()
             logger.info("Database connection closed")
 
 # Global database instance
@@ -0,0 +1,84 @@
+"""
+Gunicorn configuration
+Sizes workers to the machine, preloads and warms the model before forking,
+and recycles workers to bound memory. Picked up automatically by `gunicorn app:app`.
+
+Every setting can be overridden from the environment:
+PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS, GUNICORN_PRELOAD,
+GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS, GUNICORN_MAX_REQUESTS_JITTER and
+WARMUP_ROUNDS.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Same .env as the app, so GUNICORN_THREADS here matches the in-flight caps it derives from it
+load_dotenv()
+
+
+def available_cores():
+    """CPU cores this process may run on (respects affinity masks and container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+cores = available_cores()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Prediction is CPU-bound, so one worker per core; threads cover time spent
+# waiting on Cloudant, App ID and Watson
+workers = int(os.getenv('WEB_CONCURRENCY') or cores)
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+# Import the app and load the model once in the master; workers share its
+# memory copy-on-write and start with a warm model
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Recycle each worker after this many requests, staggered so they do not all restart at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', str(max(max_requests // 10, 1))))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+# In-process sessions and chatbot conversations are invisible to other workers;
+# share them through SQLite unless a backend was chosen explicitly. The request
+# profiler and the unflushed part of the prediction history stay per worker
+# (see DEPLOYMENT.md).
+if workers > 1:
+    os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+    os.environ.setdefault('CHAT_STORE', 'sqlite')
+
+# The model is warmed explicitly below, so skip the background warm-up thread
+os.environ.setdefault('WARM_ON_START', 'false')
+
+
+def warm(server):
+    from app import warm_up
+    rounds = int(os.getenv('WARMUP_ROUNDS', '2'))
+    try:
+        warm_up(rounds)
+        server.log.info(f"Model warmed with {rounds} round(s) of representative predictions")
+    except Exception as e:
+        server.log.error(f"Model warm-up failed: {e}")
+
+
+def when_ready(server):
+    # Runs in the master after the preload and before any worker is forked
+    if preload_app:
+        warm(server)
+
+
+def post_worker_init(worker):
+    # Without preload every worker imports the app itself, so each warms its own model
+    if not preload_app:
+        warm(worker)
@@ -0,0 +1,205 @@
+"""
+Per-user prediction history
+Buffers assessment results in memory and persists them in batches off the request path
+"""
+
+import time
+import atexit
+import secrets
+import hashlib
+import threading
+import logging
+from collections import deque
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ENTRIES = REGISTRY.counter(
+    'prediction_history_entries_total', 'Prediction history entries by outcome', ('outcome',)
+)
+HISTORY_BUFFERED = REGISTRY.gauge('prediction_history_buffered', 'Prediction history entries waiting to be written')
+HISTORY_FLUSH_SECONDS = REGISTRY.histogram('prediction_history_flush_seconds', 'Time to write one batch of history entries')
+
+# Input fields kept with each entry
+HISTORY_FIELDS = (
+    'indicator', 'age_group', 'sex', 'race_ethnicity', 'education', 'disability',
+    'gender_identity', 'sexual_orientation', 'marital_status', 'employment', 'state'
+)
+
+# Longest wait between flush attempts while the database is unavailable
+MAX_RETRY_DELAY = 60.0
+
+
+def history_prefix(user_id):
+    """Id prefix shared by every history entry of one user"""
+    digest = hashlib.sha256(str(user_id).encode('utf-8')).hexdigest()[:20]
+    return f"history:{digest}:"
+
+
+class PredictionHistory:
+    """Write-behind store of each user's assessments
+
+    ``record`` only appends to an in-memory buffer. A background thread writes
+    the buffer through the DatabaseManager every ``flush_interval`` seconds, or
+    as soon as ``batch_size`` entries are waiting, using one bulk write per
+    batch. Entries stay visible to ``page`` while they wait. If the database
+    is unavailable they are kept and flushing backs off exponentially; if no
+    database is configured at all they are only kept in memory. Beyond
+    ``max_buffer`` the oldest are dropped.
+
+    Document ids are ``history:<user hash>:<timestamp>:<random>``, so one
+    user's entries form a contiguous, time-ordered range of the primary key
+    that is paged newest first without a secondary index.
+    """
+
+    def __init__(self, db, flush_interval=2.0, batch_size=100, max_buffer=10000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._retry_delay = 0.0
+        HISTORY_BUFFERED.set_function(lambda: len(self._pending))
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='prediction-history', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """Drop the parent's buffer and start this process's own flusher"""
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._retry_delay = 0.0
+        self.start()
+
+    def record(self, user_id, inputs, prevalence, risk_level, model_version=None):
+        """Queue one assessment for ``user_id``; never blocks on the database"""
+        now = time.time()
+        entry = {
+            '_id': f"{history_prefix(user_id)}{now:017.6f}:{secrets.token_hex(4)}",
+            'type': 'prediction',
+            'user_id': user_id,
+            'created_at': now,
+            'inputs': {field: inputs[field] for field in HISTORY_FIELDS if inputs.get(field)},
+            'prevalence': prevalence,
+            'risk_level': risk_level,
+            'model_version': model_version
+        }
+        with self._lock:
+            self._pending.append(entry)
+            overflow = len(self._pending) - self.max_buffer
+            for _ in range(max(overflow, 0)):
+                self._pending.popleft()
+        HISTORY_ENTRIES.inc(outcome='recorded')
+        if overflow > 0:
+            HISTORY_ENTRIES.inc(overflow, outcome='dropped')
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        self.start()
+        return entry
+
+    def _run(self):
+        if not self.db.backend.configured:
+            logger.info("No database configured; prediction history is kept in memory only")
+        while True:
+            self._wake.wait(self._retry_delay or self.flush_interval)
+            self._wake.clear()
+            try:
+                while self.flush_batch() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Error flushing prediction history: {e}")
+
+    def flush_batch(self):
+        """Write up to ``batch_size`` pending entries; returns how many were written"""
+        with self._flush_lock:
+            return self._write_batch()
+
+    def _write_batch(self):
+        with self._lock:
+            batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+        # Nothing to write to: keep entries in memory without retrying
+        if not batch or not self.db.backend.configured:
+            return 0
+        # Not connected yet, or the circuit is open: wait rather than fail every tick
+        if self.db.db is None:
+            self._back_off(len(batch), 'database unavailable')
+            return 0
+
+        with HISTORY_FLUSH_SECONDS.time():
+            saved = self.db.save_documents(batch)
+        saved_ids = {doc['_id'] for doc in saved}
+
+        with self._lock:
+            # Remove the batch by identity; record() may have dropped some of it meanwhile
+            written = {id(entry) for entry in batch}
+            if saved_ids:
+                self._pending = deque(entry for entry in self._pending if id(entry) not in written)
+        if not saved_ids:
+            self._back_off(len(batch), 'write failed')
+            return 0
+        if self._retry_delay:
+            logger.info("Prediction history writes resumed")
+            self._retry_delay = 0.0
+
+        rejected = len(batch) - len(saved_ids)
+        HISTORY_ENTRIES.inc(len(saved_ids), outcome='saved')
+        if rejected:
+            HISTORY_ENTRIES.inc(rejected, outcome='rejected')
+        return len(batch)
+
+    def _back_off(self, pending, reason):
+        """Double the wait before the next attempt, warning only when retries begin"""
+        if not self._retry_delay:
+            logger.warning(f"Prediction history {reason}; keeping {pending} entries and retrying with backoff")
+        self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), MAX_RETRY_DELAY)
+
+    def flush(self):
+        """Write everything pending, stopping at the first failed batch"""
+        while self._pending and self.flush_batch():
+            pass
+
+    def page(self, user_id, limit=20, before=None):
+        """One page of a user's entries, newest first, and the cursor for the next page
+
+        Stored entries and those still waiting to be written are merged, so an
+        assessment appears in the history as soon as it is recorded.
+        """
+        prefix = history_prefix(user_id)
+        stored = self.db.get_documents_by_prefix(prefix, limit=limit, before=before)
+        with self._lock:
+            pending = [
+                entry for entry in self._pending
+                if entry['_id'].startswith(prefix) and (before is None or entry['_id'] < before)
+            ]
+
+        entries = {doc['_id']: doc for doc in stored}
+        entries.update((entry['_id'], entry) for entry in pending)
+        ordered = sorted(entries.values(), key=lambda doc: doc['_id'], reverse=True)[:limit]
+        next_cursor = ordered[-1]['_id'] if len(ordered) == limit else None
+        return [self._public(doc) for doc in ordered], next_cursor
+
+    @staticmethod
+    def _public(doc):
+        return {
+            'id': doc['_id'],
+            'created_at': doc.get('created_at'),
+            'inputs': doc.get('inputs', {}),
+            'prevalence': doc.get('prevalence'),
+            'risk_level': doc.get('risk_level'),
+            'model_version': doc.get('model_version')
+        }
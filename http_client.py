@@ -0,0 +1,93 @@
+"""
+Shared outbound HTTP client
+Pooled keep-alive connections with timeouts, bounded retries and latency metrics
+"""
+
+import os
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_SECONDS = REGISTRY.histogram(
+    'outbound_request_seconds', 'Latency of outbound HTTP requests', ('endpoint', 'method', 'status')
+)
+
+
+class HTTPClient:
+    """Thread-safe HTTP client backed by a pooled requests.Session
+
+    Every request gets (connect, read) timeouts unless the caller overrides them.
+    Connection errors are retried for any method since nothing was sent; read
+    errors and 502/503/504 responses are only retried for idempotent methods.
+    """
+
+    def __init__(self, name, pool_size=20, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.2):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.session = self._build_session()
+
+    def _build_session(self):
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        """Send a request, recording its latency under ``endpoint`` (defaults to the host)"""
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = endpoint or urlsplit(url).netloc
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        except requests.Timeout:
+            status = 'timeout'
+            raise
+        finally:
+            OUTBOUND_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=method, status=status)
+
+    def get(self, url, endpoint=None, **kwargs):
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def post(self, url, endpoint=None, **kwargs):
+        return self.request('POST', url, endpoint=endpoint, **kwargs)
+
+    def reset(self):
+        """Drop pooled connections (e.g. after fork) and start a fresh session"""
+        self.session.close()
+        self.session = self._build_session()
+
+    def close(self):
+        self.session.close()
+
+
+# Shared client for Google OAuth and IBM Cloud App ID traffic
+identity_http = HTTPClient(
+    'identity',
+    pool_size=int(os.getenv('IDP_POOL_SIZE', '20')),
+    connect_timeout=float(os.getenv('IDP_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('IDP_READ_TIMEOUT', '10')),
+    retries=int(os.getenv('IDP_RETRIES', '2'))
+)
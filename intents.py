@@ -0,0 +1,108 @@
+"""
+Intent matching for the mental health chatbot
+Compiles keyword intents from a data file into a single token trie
+"""
+
+import os
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intents.json')
+
+# Words are runs of letters, digits and apostrophes; everything else separates them,
+# so "self-harm" and "self harm" tokenize the same way and "this" never matches "hi"
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text):
+    """Lowercase word tokens for a message or keyword"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class Intent:
+    """A named response triggered by any of its keywords"""
+
+    __slots__ = ('name', 'priority', 'keywords', 'response', 'order')
+
+    def __init__(self, name, priority, keywords, response, order=0):
+        self.name = name
+        self.priority = priority
+        self.keywords = keywords
+        self.response = response
+        self.order = order
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, priority={self.priority})"
+
+
+class IntentMatcher:
+    """Matches messages against every intent in one left-to-right pass
+
+    Keywords (single words or phrases) are compiled into a trie keyed by word
+    token. Matching walks the trie from each token of the message, so the cost
+    depends on message length and the longest phrase, not on catalog size.
+    The highest-priority intent wins; ties go to the earliest match in the
+    message, then to catalog order.
+    """
+
+    _TERMINAL = object()
+
+    def __init__(self, intents, default_response):
+        self.intents = list(intents)
+        self.default_response = default_response
+        self._trie = {}
+        self._max_depth = 0
+        for intent in self.intents:
+            for keyword in intent.keywords:
+                tokens = tokenize(keyword)
+                if not tokens:
+                    continue
+                node = self._trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                # Keep the strongest intent if two share a keyword
+                current = node.get(self._TERMINAL)
+                if current is None or (intent.priority, -intent.order) > (current.priority, -current.order):
+                    node[self._TERMINAL] = intent
+                self._max_depth = max(self._max_depth, len(tokens))
+
+    @classmethod
+    def from_dict(cls, data):
+        intents = [
+            Intent(item['name'], int(item.get('priority', 0)), item['keywords'], item['response'], order=index)
+            for index, item in enumerate(data['intents'])
+        ]
+        return cls(intents, data['default_response'])
+
+    @classmethod
+    def from_file(cls, path=INTENTS_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def match(self, message):
+        """Return the best matching Intent for ``message``, or None"""
+        tokens = tokenize(message)
+        trie = self._trie
+        terminal = self._TERMINAL
+        best = None
+        best_key = None
+        for start in range(len(tokens)):
+            node = trie
+            for token in tokens[start:start + self._max_depth]:
+                node = node.get(token)
+                if node is None:
+                    break
+                intent = node.get(terminal)
+                if intent is not None:
+                    key = (intent.priority, -start, -intent.order)
+                    if best_key is None or key > best_key:
+                        best, best_key = intent, key
+        return best
+
+    def respond(self, message):
+        """Return the response text for ``message``, falling back to the default"""
+        intent = self.match(message)
+        return intent.response if intent else self.default_response
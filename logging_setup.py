@@ -0,0 +1,97 @@
+"""
+Buffered structured logging
+Request threads hand records to an in-memory queue; a background listener formats and writes them
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+_settings = {}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra={'fields': {...}}`` data"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the buffer is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def configure_logging(level=None, fmt=None, buffer_size=None):
+    """Route all logging through a bounded queue drained by a background thread
+
+    LOG_LEVEL sets the level, LOG_FORMAT chooses ``json`` (default) or ``text``
+    and LOG_BUFFER_SIZE bounds how many records may wait to be written.
+    Safe to call more than once; later calls restart the listener.
+    """
+    global _listener
+
+    _settings.update(level=level, fmt=fmt, buffer_size=buffer_size)
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'json')).lower()
+    buffer_size = buffer_size or int(os.getenv('LOG_BUFFER_SIZE', '10000'))
+
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stderr)
+    if fmt == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    records = queue.Queue(maxsize=buffer_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(records))
+    root.setLevel(level)
+
+    _listener = QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def restart_after_fork():
+    """Start a new queue and listener in a forked child; the parent's listener thread is not copied"""
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    configure_logging(**_settings)
+
+
+@atexit.register
+def _flush_on_exit():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
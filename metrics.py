@@ -0,0 +1,222 @@
+"""
+Lightweight in-process metrics
+Counters, gauges and latency histograms shared by the database, HTTP and web layers,
+with Prometheus text exposition
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for latency histograms
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback"""
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        """Report ``fn()`` whenever the gauge is read"""
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._functions[key] = fn
+
+    def snapshot(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [(dict(zip(self.labelnames, key)), value) for key, value in values.items()]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the wrapped block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Return per-label-set count, sum, mean and approximate percentiles"""
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        result = []
+        for key, counts, total, count in items:
+            result.append({
+                'labels': dict(zip(self.labelnames, key)),
+                'buckets': counts,
+                'count': count,
+                'sum': total,
+                'mean': total / count if count else 0.0,
+                'p50': self._quantile(counts, count, 0.50),
+                'p95': self._quantile(counts, count, 0.95),
+                'p99': self._quantile(counts, count, 0.99),
+            })
+        return result
+
+    def _quantile(self, counts, count, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    """Named collection of metrics; lookups return the existing metric if registered"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, description, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, description, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name, description, labelnames=()):
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, description, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = []
+    for name, value in items:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(registry):
+    """Render every metric in ``registry`` in the Prometheus text format (0.0.4)"""
+    lines = []
+    for metric in sorted(registry.metrics(), key=lambda m: m.name):
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        if isinstance(metric, Histogram):
+            lines.append(f"# TYPE {metric.name} histogram")
+            for series in metric.snapshot():
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), series['buckets']):
+                    cumulative += count
+                    le = _format_labels(series['labels'], {'le': _format_value(bound)})
+                    lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                labels = _format_labels(series['labels'])
+                lines.append(f"{metric.name}_sum{labels} {_format_value(series['sum'])}")
+                lines.append(f"{metric.name}_count{labels} {series['count']}")
+        else:
+            kind = 'counter' if isinstance(metric, Counter) else 'gauge'
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for labels, value in metric.snapshot():
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# Global registry instance
+REGISTRY = Registry()
+
+CACHE_LOOKUPS = REGISTRY.counter('cache_lookups_total', 'Cache lookups by cache and result', ('cache', 'result'))
+CACHE_HIT_RATIO = REGISTRY.gauge('cache_hit_ratio', 'Fraction of cache lookups that were hits', ('cache',))
+
+
+def cache_hit_ratio(cache):
+    """Hits divided by all lookups for ``cache`` (0.0 before the first lookup)"""
+    results = {labels['result']: value for labels, value in CACHE_LOOKUPS.snapshot() if labels['cache'] == cache}
+    total = sum(results.values())
+    return results.get('hit', 0) / total if total else 0.0
+
+
+def register_cache(cache):
+    """Publish a hit-ratio gauge for ``cache``"""
+    CACHE_HIT_RATIO.set_function(lambda: cache_hit_ratio(cache), cache=cache)
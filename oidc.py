@@ -0,0 +1,210 @@
+"""
+OpenID Connect helpers for IBM Cloud App ID
+Caches the discovery document and JWKS in process and verifies ID tokens locally
+"""
+
+import os
+import time
+import threading
+import logging
+from http_client import identity_http
+from metrics import CACHE_LOOKUPS, register_cache
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts for identity-provider metadata
+METADATA_TIMEOUT = (3.05, 5)
+
+
+class CachedJSONDocument:
+    """JSON document fetched over HTTP and cached with a TTL
+
+    Within ``ttl`` the cached copy is returned as is. After that the stale copy
+    keeps being served while a single background thread refreshes it, so only
+    the very first caller ever waits on the network. If a refresh fails the
+    stale copy is kept until ``max_stale`` has passed.
+    """
+
+    def __init__(self, name, url, ttl=3600, max_stale=86400):
+        self.name = name
+        register_cache(name)
+        # url may be a string or a callable returning one (e.g. resolved from discovery)
+        self._url = url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._value = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def url(self):
+        return self._url() if callable(self._url) else self._url
+
+    @property
+    def cached(self):
+        return self._value is not None
+
+    def _fetch(self):
+        url = self.url
+        if not url:
+            return None
+        response = identity_http.get(url, endpoint=self.name, timeout=METADATA_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self):
+        """Fetch the document now, keeping the cached copy on failure"""
+        try:
+            value = self._fetch()
+            if value is not None:
+                with self._lock:
+                    self._value = value
+                    self._fetched_at = time.monotonic()
+            return value
+        except Exception as e:
+            logger.error(f"Error refreshing {self.name}: {e}")
+            return None
+        finally:
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name=f"refresh-{self.name}", daemon=True).start()
+
+    def prefetch(self):
+        """Warm the cache in the background without blocking the caller"""
+        if self._value is None and self.url:
+            self._refresh_in_background()
+
+    def get(self):
+        """Return the cached document, fetching or refreshing it as needed"""
+        age = time.monotonic() - self._fetched_at
+        if self._value is not None:
+            if age >= self.ttl:
+                self._refresh_in_background()
+            if age < self.ttl + self.max_stale:
+                CACHE_LOOKUPS.inc(cache=self.name, result='hit' if age < self.ttl else 'stale')
+                return self._value
+        # Nothing usable cached yet: fetch inline
+        CACHE_LOOKUPS.inc(cache=self.name, result='miss')
+        return self.refresh()
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._fetched_at = 0.0
+
+
+class JWKSCache:
+    """Signing keys from a JWKS document, indexed by key id"""
+
+    def __init__(self, document, min_refresh_interval=60):
+        self.document = document
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._source = None
+        self._last_forced = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, jwks):
+        import jwt
+
+        # Parse keys only when the underlying document changes
+        with self._lock:
+            if jwks is not self._source:
+                keys = {}
+                for jwk in jwks.get('keys', []):
+                    try:
+                        keys[jwk.get('kid')] = (jwt.PyJWK(jwk), jwk.get('alg', 'RS256'))
+                    except jwt.PyJWTError as e:
+                        logger.warning(f"Skipping unusable signing key {jwk.get('kid')}: {e}")
+                self._keys = keys
+                self._source = jwks
+            return self._keys
+
+    def get_key(self, kid):
+        """Return (PyJWK, algorithm) for ``kid``, refreshing once if the key is unknown (key rotation)"""
+        jwks = self.document.get()
+        keys = self._index(jwks) if jwks else {}
+        if kid in keys:
+            return keys[kid]
+
+        now = time.monotonic()
+        if now - self._last_forced >= self.min_refresh_interval:
+            self._last_forced = now
+            jwks = self.document.refresh()
+            keys = self._index(jwks) if jwks else {}
+        return keys.get(kid)
+
+
+class TokenVerificationError(Exception):
+    """Raised when an ID token cannot be verified"""
+
+
+class OIDCProvider:
+    """Cached discovery, JWKS and ID token verification for one issuer"""
+
+    def __init__(self, discovery_endpoint, client_id, ttl=3600):
+        self.client_id = client_id
+        self.discovery = CachedJSONDocument('oidc-discovery', discovery_endpoint, ttl=ttl)
+        self.jwks = JWKSCache(CachedJSONDocument('oidc-jwks', self._jwks_uri, ttl=ttl))
+
+    def _jwks_uri(self):
+        config = self.discovery.get()
+        return config.get('jwks_uri') if config else None
+
+    def get_config(self):
+        """Return the discovery document, or None if it cannot be obtained"""
+        return self.discovery.get()
+
+    def prefetch(self):
+        """Warm discovery and JWKS caches in the background"""
+        def warm():
+            if self.discovery.refresh():
+                self.jwks.document.refresh()
+        if self.discovery.url:
+            threading.Thread(target=warm, name='oidc-prefetch', daemon=True).start()
+
+    def verify_id_token(self, token, leeway=30):
+        """Verify an ID token's signature and claims against the cached keys"""
+        # PyJWT and cryptography are imported on first login rather than at app startup
+        import jwt
+
+        config = self.get_config()
+        if not config:
+            raise TokenVerificationError("Discovery document unavailable")
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise TokenVerificationError(f"Malformed token: {e}")
+
+        entry = self.jwks.get_key(header.get('kid'))
+        if entry is None:
+            raise TokenVerificationError(f"Unknown signing key: {header.get('kid')}")
+
+        key, algorithm = entry
+        try:
+            return jwt.decode(
+                token,
+                key.key,
+                algorithms=[algorithm],
+                audience=self.client_id,
+                issuer=config.get('issuer'),
+                leeway=leeway
+            )
+        except jwt.PyJWTError as e:
+            raise TokenVerificationError(str(e))
+
+
+def create_appid_provider():
+    """Build the App ID provider from environment configuration"""
+    return OIDCProvider(
+        os.getenv('APPID_DISCOVERY_ENDPOINT'),
+        os.getenv('APPID_CLIENT_ID'),
+        ttl=int(os.getenv('OIDC_CACHE_TTL', '3600'))
+    )
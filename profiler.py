@@ -0,0 +1,166 @@
+"""
+On-demand request profiling
+Samples the stacks of a fraction of in-flight requests and aggregates them per route
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+import logging
+from collections import Counter, defaultdict
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PROFILED_REQUESTS = REGISTRY.counter('profiled_requests_total', 'Requests sampled by the profiler', ('route',))
+
+# Stacks deeper than this are cut at the root end
+MAX_STACK_DEPTH = 64
+
+
+def collapse_stack(frame, max_depth=MAX_STACK_DEPTH):
+    """Render a frame's stack root-first in collapsed (flame graph) form"""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        names.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RequestProfiler:
+    """Statistical profiler for a sampled fraction of requests
+
+    While enabled, ``sample_rate`` of requests register their thread on entry
+    and a single background thread reads those threads' stacks every
+    ``interval`` seconds with ``sys._current_frames``. Stacks are counted per
+    route and exported in collapsed-stack format, ready for flamegraph.pl or
+    speedscope. When disabled, ``begin`` is one attribute check and no thread
+    runs.
+    """
+
+    def __init__(self, sample_rate=0.1, interval=0.005, max_stacks=5000):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.enabled = False
+        self.started_at = None
+        self._active = {}
+        self._stacks = defaultdict(Counter)
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, sample_rate=None, interval=None):
+        """Begin sampling requests; safe to call while already running to change settings"""
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if interval is not None:
+            self.interval = max(float(interval), 0.001)
+        with self._lock:
+            if self.enabled:
+                return
+            self.enabled = True
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+            self._thread.start()
+        logger.info(f"Request profiler started (sample rate {self.sample_rate}, interval {self.interval}s)")
+
+    def stop(self):
+        """Stop sampling; aggregated stacks are kept until reset()"""
+        with self._lock:
+            self.enabled = False
+            thread, self._thread = self._thread, None
+            self._active.clear()
+        if thread is not None:
+            thread.join(timeout=1)
+            logger.info("Request profiler stopped")
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+
+    def after_fork(self):
+        """Restart sampling in a forked worker if it was running in the parent"""
+        was_enabled = self.enabled
+        self.enabled = False
+        self._thread = None
+        self._active = {}
+        self._lock = threading.Lock()
+        if was_enabled:
+            self.start()
+
+    def begin(self, route):
+        """Register the current thread for sampling if this request is selected"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        self._active[threading.get_ident()] = route
+        PROFILED_REQUESTS.inc(route=route)
+        return True
+
+    def end(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while self.enabled:
+            time.sleep(self.interval)
+            active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, route in active.items():
+                    frame = frames.get(ident)
+                    if frame is None or ident == own:
+                        continue
+                    stacks = self._stacks[route]
+                    stack = collapse_stack(frame)
+                    if stack not in stacks and len(stacks) >= self.max_stacks:
+                        stack = '[other stacks]'
+                    stacks[stack] += 1
+                    self._samples += 1
+            del frames
+
+    def collapsed(self, route=None):
+        """Collapsed-stack text, one ``route;frame;...;frame count`` line per stack"""
+        with self._lock:
+            routes = {route: self._stacks.get(route, {})} if route else dict(self._stacks)
+            lines = [
+                f"{name};{stack} {count}"
+                for name, stacks in sorted(routes.items())
+                for stack, count in sorted(stacks.items(), key=lambda item: -item[1])
+            ]
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def status(self):
+        with self._lock:
+            routes = {route: sum(stacks.values()) for route, stacks in self._stacks.items()}
+        return {
+            # Each worker process profiles only its own requests
+            'pid': os.getpid(),
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'interval': self.interval,
+            'started_at': self.started_at,
+            'in_flight': len(self._active),
+            'samples': self._samples,
+            'samples_by_route': routes,
+            'requests_by_route': {labels['route']: value for labels, value in PROFILED_REQUESTS.snapshot()}
+        }
+
+
+def create_profiler():
+    """Build the profiler from PROFILER_* settings, starting it if PROFILER_ENABLED is set"""
+    profiler = RequestProfiler(
+        sample_rate=float(os.getenv('PROFILER_SAMPLE_RATE', '0.1')),
+        interval=float(os.getenv('PROFILER_INTERVAL', '0.005')),
+        max_stacks=int(os.getenv('PROFILER_MAX_STACKS', '5000'))
+    )
+    if os.getenv('PROFILER_ENABLED', 'false').lower() == 'true':
+        profiler.start()
+    return profiler
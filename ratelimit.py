@@ -0,0 +1,246 @@
+"""
+Admission control
+Per-client token buckets and concurrency caps that shed excess load before it queues
+"""
+
+import os
+import math
+import time
+import zlib
+import threading
+import logging
+from collections import OrderedDict
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    'admission_rejections_total', 'Requests refused by admission control', ('group', 'reason')
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge('admission_in_flight', 'Admitted requests currently running', ('group',))
+
+# Independent lock stripes; a request only contends with others hashing to the same stripe
+DEFAULT_STRIPES = 16
+
+
+class TokenBucketLimiter:
+    """Token bucket per key: ``capacity`` requests at once, refilled at ``rate`` per second
+
+    Buckets live in lock-striped LRU maps, so concurrent requests for different
+    clients rarely share a lock and memory stays bounded at ``max_keys``
+    buckets. A client whose bucket is evicted simply starts again with a full
+    one.
+    """
+
+    def __init__(self, rate, capacity, max_keys=10000, stripes=DEFAULT_STRIPES):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys_per_stripe = max(max_keys // stripes, 1)
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(stripes)]
+
+    def acquire(self, key):
+        """Take a token for ``key``; returns (allowed, seconds until one is available)"""
+        lock, buckets = self._stripes[zlib.crc32(key.encode('utf-8')) % len(self._stripes)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [float(self.capacity), now]
+                if len(buckets) > self.max_keys_per_stripe:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return sum(len(buckets) for _, buckets in self._stripes)
+
+    def after_fork(self):
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in self._stripes]
+
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on requests running at once; refuses instead of queueing"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+
+    def after_fork(self):
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+
+class RouteBudget:
+    """Rate limit and concurrency cap shared by a group of endpoints"""
+
+    def __init__(self, name, rate_limiter=None, concurrency=None):
+        self.name = name
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        if concurrency:
+            ADMISSION_IN_FLIGHT.set_function(lambda: self.concurrency.in_flight, group=name)
+
+
+class Rejection:
+    """Why a request was refused, with the HTTP status and Retry-After to answer with"""
+
+    __slots__ = ('group', 'reason', 'status', 'retry_after')
+
+    def __init__(self, group, reason, status, retry_after):
+        self.group = group
+        self.reason = reason
+        self.status = status
+        self.retry_after = max(int(math.ceil(retry_after)), 1)
+
+
+class AdmissionController:
+    """Decides whether a request may run before any work is done for it
+
+    A request whose endpoint belongs to a budget first takes a token from that
+    budget's per-client bucket (429 when empty). It then takes a slot from the
+    process-wide cap (``max_in_flight``) and from the budget's own concurrency
+    cap, getting 503 when either is full. ``admit`` returns the slots to hand
+    back to ``release`` once the response is finished, or a Rejection.
+    """
+
+    def __init__(self, max_in_flight=0, retry_after=1.0, exempt=()):
+        self.budgets = {}
+        self.retry_after = retry_after
+        self.exempt = set(exempt)
+        self.global_cap = ConcurrencyLimiter(max_in_flight) if max_in_flight else None
+        if self.global_cap:
+            ADMISSION_IN_FLIGHT.set_function(lambda: self.global_cap.in_flight, group='global')
+
+    def add_budget(self, name, endpoints, rate=None, capacity=None, max_in_flight=0, max_keys=10000):
+        """Apply one budget to ``endpoints``; ``rate`` is tokens per second per client"""
+        limiter = TokenBucketLimiter(rate, capacity or max(rate, 1), max_keys) if rate else None
+        budget = RouteBudget(name, limiter, ConcurrencyLimiter(max_in_flight) if max_in_flight else None)
+        for endpoint in endpoints:
+            self.budgets[endpoint] = budget
+        return budget
+
+    def admit(self, endpoint, client_key):
+        """Returns (slots, None) when admitted or (None, Rejection) when refused
+
+        ``client_key`` is a callable returning the caller's bucket key; it is
+        only called for rate-limited endpoints.
+        """
+        if endpoint in self.exempt:
+            return [], None
+
+        budget = self.budgets.get(endpoint)
+        # Rate limit first: a client over its budget gets 429 without taking any slot
+        if budget is not None and budget.rate_limiter is not None:
+            allowed, wait = budget.rate_limiter.acquire(client_key())
+            if not allowed:
+                return None, self._reject(budget.name, 'rate_limited', 429, wait)
+
+        slots = []
+        if self.global_cap:
+            if not self.global_cap.try_acquire():
+                return None, self._reject('global', 'overloaded', 503, self.retry_after)
+            slots.append(self.global_cap)
+
+        if budget and budget.concurrency:
+            if not budget.concurrency.try_acquire():
+                self.release(slots)
+                return None, self._reject(budget.name, 'concurrency', 503, self.retry_after)
+            slots.append(budget.concurrency)
+        return slots, None
+
+    @staticmethod
+    def release(slots):
+        for slot in slots:
+            slot.release()
+
+    def _reject(self, group, reason, status, retry_after):
+        ADMISSION_REJECTIONS.inc(group=group, reason=reason)
+        return Rejection(group, reason, status, retry_after)
+
+    def after_fork(self):
+        """Start a forked worker with empty buckets and counters and fresh locks"""
+        if self.global_cap:
+            self.global_cap.after_fork()
+        for budget in set(self.budgets.values()):
+            if budget.rate_limiter is not None:
+                budget.rate_limiter.after_fork()
+            if budget.concurrency:
+                budget.concurrency.after_fork()
+
+    def status(self):
+        budgets = {}
+        for budget in set(self.budgets.values()):
+            budgets[budget.name] = {
+                'rate_per_second': budget.rate_limiter.rate if budget.rate_limiter is not None else None,
+                'burst': budget.rate_limiter.capacity if budget.rate_limiter is not None else None,
+                'tracked_clients': len(budget.rate_limiter) if budget.rate_limiter is not None else 0,
+                'max_in_flight': budget.concurrency.limit if budget.concurrency else None,
+                'in_flight': budget.concurrency.in_flight if budget.concurrency else None
+            }
+        return {
+            'max_in_flight': self.global_cap.limit if self.global_cap else None,
+            'in_flight': self.global_cap.in_flight if self.global_cap else None,
+            'budgets': budgets,
+            'rejections': [dict(labels, count=value) for labels, value in ADMISSION_REJECTIONS.snapshot()]
+        }
+
+
+def parse_rate(spec):
+    """Parse ``"<requests>/<seconds>"`` (e.g. ``"30/60"``) into (tokens per second, burst)
+
+    An empty spec or ``0`` disables the rate limit and returns (None, None).
+    """
+    spec = (spec or '').strip()
+    if not spec or spec == '0':
+        return None, None
+    count, _, seconds = spec.partition('/')
+    count, seconds = int(count), float(seconds or 1)
+    return count / seconds, count
+
+
+def create_admission_controller(budgets, exempt=(), max_in_flight=64):
+    """Build the controller from RATE_LIMIT_* settings
+
+    ``budgets`` maps a budget name to (endpoints, default rate spec, default
+    concurrency cap). Each budget is configured by RATE_LIMIT_<NAME> (a
+    "requests/seconds" spec, 0 to disable) and MAX_IN_FLIGHT_<NAME>; the
+    process-wide cap is MAX_IN_FLIGHT_REQUESTS (default ``max_in_flight``).
+    Limits are per process, so
+    with several workers a client's effective budget is up to workers times
+    larger. RATE_LIMIT_ENABLED=false admits everything.
+    """
+    enabled = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    controller = AdmissionController(
+        max_in_flight=int(os.getenv('MAX_IN_FLIGHT_REQUESTS', str(max_in_flight))) if enabled else 0,
+        retry_after=float(os.getenv('RATE_LIMIT_RETRY_AFTER', '1')),
+        exempt=exempt
+    )
+    if not enabled:
+        logger.info("Admission control disabled")
+        return controller
+
+    max_keys = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '10000'))
+    for name, (endpoints, default_rate, default_in_flight) in budgets.items():
+        setting = name.upper()
+        rate, burst = parse_rate(os.getenv(f'RATE_LIMIT_{setting}', default_rate))
+        max_in_flight = int(os.getenv(f'MAX_IN_FLIGHT_{setting}', str(default_in_flight)))
+        controller.add_budget(name, endpoints, rate, burst, max_in_flight, max_keys)
+    return controller
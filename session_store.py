@@ -0,0 +1,309 @@
+"""
+Server-side session storage
+Keeps session data on the server and only an opaque signed id in the cookie
+"""
+
+import os
+import copy
+import time
+import sqlite3
+import secrets
+import threading
+import logging
+from collections import OrderedDict
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from metrics import REGISTRY, CACHE_LOOKUPS, register_cache
+
+logger = logging.getLogger(__name__)
+
+SESSION_EVICTIONS = REGISTRY.counter('session_evictions_total', 'Server-side sessions evicted', ('reason',))
+register_cache('session')
+
+
+class SessionStore:
+    """Key-value store for session data with per-entry expiry"""
+
+    def get(self, sid):
+        """Return (data, expires_at) for a live session, or None"""
+        raise NotImplementedError
+
+    def set(self, sid, data, ttl):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def evict_expired(self):
+        """Remove every expired session in one pass, returning how many were removed"""
+        raise NotImplementedError
+
+    def after_fork(self):
+        """Drop locks and connections inherited from the parent process"""
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU store for single-node deployments"""
+
+    def __init__(self, max_entries=10000, sweep_interval=60):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, sid):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= now:
+                del self._data[sid]
+                SESSION_EVICTIONS.inc(reason='expired')
+                return None
+            self._data.move_to_end(sid)
+        return copy.deepcopy(data), expires_at
+
+    def set(self, sid, data, ttl):
+        entry = (copy.deepcopy(data), time.time() + ttl)
+        with self._lock:
+            self._data[sid] = entry
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                SESSION_EVICTIONS.inc(reason='capacity')
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.evict_expired()
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def evict_expired(self):
+        now = time.time()
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            expired = [sid for sid, (_, expires_at) in self._data.items() if expires_at <= now]
+            for sid in expired:
+                del self._data[sid]
+        if expired:
+            SESSION_EVICTIONS.inc(len(expired), reason='expired')
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed store shared by every worker process on one box
+
+    Stands in for a networked shared store: any worker can serve any session.
+    Other per-user state with an expiry (chatbot conversations) reuses it with
+    its own file and eviction counter.
+    """
+
+    def __init__(self, path='sessions.db', sweep_interval=60, evictions=SESSION_EVICTIONS):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.evictions = evictions
+        self.serializer = TaggedJSONSerializer()
+        self._local = threading.local()
+        self._last_sweep = time.monotonic()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, expires_at REAL NOT NULL, data TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return self.serializer.loads(row[0]), row[1]
+
+    def set(self, sid, data, ttl):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (id, expires_at, data) VALUES (?, ?, ?)",
+            (sid, time.time() + ttl, self.serializer.dumps(data))
+        )
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.evict_expired()
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def after_fork(self):
+        self._local = threading.local()
+
+    def evict_expired(self):
+        self._last_sweep = time.monotonic()
+        cursor = self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        if cursor.rowcount:
+            self.evictions.inc(cursor.rowcount, reason='expired')
+        return cursor.rowcount
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose contents live in a SessionStore"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.previous_sid = None
+        self.modified = False
+        self.accessed = False
+
+    def regenerate(self):
+        """Move the data to a fresh id, e.g. on login, so an id known before it is worthless
+
+        The old entry is deleted and the new cookie set when the session is saved.
+        """
+        if not self.new and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface storing data server-side under a signed opaque id"""
+
+    salt = 'server-side-session'
+
+    def __init__(self, store, ttl=86400):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _ttl(self, app, session):
+        if session.permanent:
+            return int(app.permanent_session_lifetime.total_seconds())
+        return self.ttl
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                try:
+                    found = self.store.get(sid)
+                except Exception as e:
+                    logger.error(f"Session store lookup failed: {e}")
+                    found = None
+                if found is not None:
+                    CACHE_LOOKUPS.inc(cache='session', result='hit')
+                    data, expires_at = found
+                    return ServerSideSession(data, sid=sid, expires_at=expires_at)
+                CACHE_LOOKUPS.inc(cache='session', result='miss')
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # A regenerated session must not stay reachable under its old id
+        if session.previous_sid:
+            try:
+                self.store.delete(session.previous_sid)
+            except Exception as e:
+                logger.error(f"Session store delete failed: {e}")
+
+        # Emptied sessions are removed from the store and the cookie is cleared
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.vary.add("Cookie")
+            return
+
+        ttl = self._ttl(app, session)
+        # Re-save unmodified sessions only once half their lifetime has passed (sliding expiry)
+        stale = session.expires_at is not None and session.expires_at - time.time() < ttl / 2
+        if not (session.modified or session.new or stale):
+            return
+
+        try:
+            self.store.set(session.sid, dict(session), ttl)
+        except Exception as e:
+            logger.error(f"Session store write failed: {e}")
+            return
+
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid.encode()).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+            response.vary.add("Cookie")
+
+
+def create_session_interface(kind=None):
+    """Build the session interface selected by SESSION_BACKEND
+
+    ``memory`` (default) keeps sessions in an in-process LRU, ``sqlite`` shares
+    them between workers through SESSION_SQLITE_PATH, and ``cookie`` keeps
+    Flask's default signed-cookie sessions (returns None).
+    """
+    kind = (kind or os.getenv('SESSION_BACKEND', 'memory')).lower()
+    ttl = int(os.getenv('SESSION_TTL', '86400'))
+    if kind == 'cookie':
+        return None
+    if kind == 'sqlite':
+        store = SQLiteSessionStore(os.getenv('SESSION_SQLITE_PATH', 'sessions.db'))
+    else:
+        if kind != 'memory':
+            logger.warning(f"Unknown SESSION_BACKEND '{kind}', using in-process memory store")
+        store = MemorySessionStore(max_entries=int(os.getenv('SESSION_MAX_ENTRIES', '10000')))
+    return ServerSideSessionInterface(store, ttl=ttl)
@@ -0,0 +1,124 @@
+"""
+Startup profiling and lazy initialization
+Records how long each import and init step takes and defers heavy subsystems until first use
+"""
+
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """Timeline of import and initialization steps for the current process"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready_at = None
+        self.steps = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name, kind='init'):
+        """Time the wrapped block and record it as a startup step"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.steps.append({
+                    'name': name,
+                    'kind': kind,
+                    'offset': round(start - self.started_at, 4),
+                    'seconds': round(end - start, 4),
+                    'thread': threading.current_thread().name,
+                    'error': error
+                })
+
+    def mark_ready(self):
+        """Record the moment the app module finished importing"""
+        self.ready_at = time.perf_counter()
+
+    def report(self):
+        """Boot time broken down per step, slowest first"""
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s['seconds'], reverse=True)
+        boot = (self.ready_at or time.perf_counter()) - self.started_at
+        return {
+            'boot_seconds': round(boot, 4),
+            'import_seconds': round(sum(s['seconds'] for s in steps if s['kind'] == 'import'), 4),
+            'steps': steps
+        }
+
+    def log_report(self):
+        report = self.report()
+        lines = [f"  {s['seconds']:8.4f}s  {s['kind']:<6} {s['name']}" for s in report['steps']]
+        logger.info(f"Startup finished in {report['boot_seconds']:.4f}s\n" + "\n".join(lines))
+
+
+class LazyResource:
+    """Value created by ``factory`` on first use, at most once per process
+
+    ``warm_in_background()`` starts creating it on a daemon thread so the first
+    request usually finds it ready; callers that arrive earlier simply wait.
+    """
+
+    def __init__(self, name, factory, profile=None):
+        self.name = name
+        self.factory = factory
+        self.profile = profile
+        self._value = None
+        self._loaded = False
+        self._error = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def error(self):
+        return self._error
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                try:
+                    if self.profile:
+                        with self.profile.step(self.name, kind='lazy'):
+                            self._value = self.factory()
+                    else:
+                        self._value = self.factory()
+                    self._error = None
+                except Exception as e:
+                    self._error = str(e)
+                    raise
+                self._loaded = True
+        return self._value
+
+    def after_fork(self):
+        """Renew the lock in a forked child, where a load running in the parent can never finish"""
+        if not self._loaded:
+            self._lock = threading.Lock()
+
+    def warm_in_background(self):
+        """Create the value on a daemon thread, logging rather than raising failures"""
+        def warm():
+            try:
+                self.get()
+            except Exception as e:
+                logger.error(f"Warming {self.name} failed: {e}")
+        threading.Thread(target=warm, name=f"warm-{self.name}", daemon=True).start()
+
+
+# Process-wide startup profile
+startup_profile = StartupProfile()
@@ -321,50 +321,158 @@ document.addEventListener('DOMContentLoaded', function() {
             this.showTyping();
 
             try {
-                const response = await fetch('/chatbot/message', {
+                // Prefer the streaming endpoint; fall back to a single JSON reply
+                if (!(await this.streamReply(message))) {
+                    await this.fetchReply(message);
+                }
+            } catch (error) {
+                console.error('Chatbot error:', error);
+                this.hideTyping();
+                setTimeout(() => {
+                    this.addMessage("I'm sorry, I'm having trouble connecting right now. Please try again later.", 'bot');
+                }, 500);
+            } finally {
+                this.sendBtn.disabled = false;
+            }
+        }
+
+        async streamReply(message) {
+            // Render the reply as it arrives over Server-Sent Events.
+            // Returns false only when the stream endpoint could not be used at all
+            // (no browser support, network error or 404), so the caller can fall back
+            // without sending the message twice.
+            if (!window.ReadableStream || !window.TextDecoder) return false;
+
+            let response;
+            try {
+                response = await fetch('/chatbot/message/stream', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Accept': 'text/event-stream',
                     },
                     body: JSON.stringify({
                         message: message,
                         session_id: this.sessionId
                     })
                 });
-
-                const data = await response.json();
-                
-                // Hide typing indicator
+            } catch (error) {
+                return false;
+            }
+            if (response.status === 404) return false;
+            if (!response.ok) {
+                // Rate limited or busy: retrying elsewhere would only add load
                 this.hideTyping();
-
-                if (data.success) {
-                    // Add bot response
-                    setTimeout(() => {
-                        this.addMessage(data.message, 'bot');
-                    }, 500);
-                    
-                    // Update session ID if provided
-                    if (data.session_id) {
-                        this.sessionId = data.session_id;
+                this.addMessage(await this.errorMessage(response), 'bot');
+                return true;
+            }
+            if (!response.body) throw new Error('Streaming response has no body');
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let textEl = null;
+
+            let finished = false;
+
+            while (!finished) {
+                let chunk;
+                try {
+                    chunk = await reader.read();
+                } catch (error) {
+                    // The reply was already generated server-side; do not ask for it again
+                    console.error('Chatbot stream interrupted:', error);
+                    break;
+                }
+                const { value, done } = chunk;
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventName = 'message';
+                    let dataText = '';
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                        else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+                    });
+                    const payload = dataText ? JSON.parse(dataText) : {};
+
+                    if (payload.session_id) {
+                        this.sessionId = payload.session_id;
+                    }
+                    if (eventName === 'token') {
+                        if (!textEl) {
+                            this.hideTyping();
+                            textEl = this.createMessage('bot');
+                        }
+                        textEl.textContent += payload.text;
+                        this.scrollToBottom();
+                    } else if (eventName === 'done') {
+                        finished = true;
                     }
-                } else {
-                    // Add error message
-                    setTimeout(() => {
-                        this.addMessage("I'm sorry, I'm having trouble connecting right now. Please try again later.", 'bot');
-                    }, 500);
                 }
-            } catch (error) {
-                console.error('Chatbot error:', error);
+            }
+
+            if (!textEl) {
                 this.hideTyping();
+                this.addMessage("I'm sorry, I'm having trouble connecting right now. Please try again later.", 'bot');
+            }
+            return true;
+        }
+
+        async errorMessage(response) {
+            // Prefer the server's explanation (e.g. the rate-limit message)
+            try {
+                const data = await response.json();
+                if (data.error) return data.error;
+            } catch (error) {
+                // Not JSON; use the generic message below
+            }
+            return "I'm sorry, I'm having trouble connecting right now. Please try again later.";
+        }
+
+        async fetchReply(message) {
+            const response = await fetch('/chatbot/message', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    message: message,
+                    session_id: this.sessionId
+                })
+            });
+
+            const data = await response.json();
+            
+            // Hide typing indicator
+            this.hideTyping();
+
+            if (data.success) {
+                // Add bot response
                 setTimeout(() => {
-                    this.addMessage("I'm sorry, I'm having trouble connecting right now. Please try again later.", 'bot');
+                    this.addMessage(data.message, 'bot');
+                }, 500);
+                
+                // Update session ID if provided
+                if (data.session_id) {
+                    this.sessionId = data.session_id;
+                }
+            } else {
+                // Add error message, using the server's when it sent one (e.g. rate limited)
+                setTimeout(() => {
+                    this.addMessage(data.error || "I'm sorry, I'm having trouble connecting right now. Please try again later.", 'bot');
                 }, 500);
-            } finally {
-                this.sendBtn.disabled = false;
             }
         }
 
-        addMessage(content, sender) {
+        createMessage(sender) {
+            // Append an empty message bubble and return its text element
             const messageDiv = document.createElement('div');
             messageDiv.className = `chatbot-message ${sender}-message`;
             
@@ -372,12 +480,17 @@ document.addEventListener('DOMContentLoaded', function() {
             
             messageDiv.innerHTML = `
                 <div class="message-content">
-                    <p>${this.escapeHtml(content)}</p>
+                    <p></p>
                 </div>
                 <div class="message-time">${currentTime}</div>
             `;
 
             this.messages.appendChild(messageDiv);
+            return messageDiv.querySelector('.message-content p');
+        }
+
+        addMessage(content, sender) {
+            this.createMessage(sender).textContent = content;
             this.scrollToBottom();
         }
 
@@ -397,12 +510,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 this.messages.scrollTop = this.messages.scrollHeight;
             }, 100);
         }
-
-        escapeHtml(text) {
-            const div = document.createElement('div');
-            div.textContent = text;
-            return div.innerHTML;
-        }
     }
 
     // Initialize chatbot when DOM is loaded
@@ -0,0 +1,394 @@
+"""
+Storage backends for the database layer
+Provides a common document interface over Cloudant and SQLite/in-memory engines
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import logging
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_NAME = "mental_health_users"
+
+# Sorts after any character used in document ids, closing a prefix range
+ID_PREFIX_END = "\uffff"
+
+
+def id_prefix_upper_bound(prefix, before=None):
+    """Exclusive upper id for a prefix scan; a cursor outside the prefix cannot widen it"""
+    end = prefix + ID_PREFIX_END
+    return min(before, end) if before else end
+
+
+class StorageBackend:
+    """Document store interface used by DatabaseManager
+
+    Documents are plain dicts keyed by ``_id``. Saving a document returns a copy
+    with its new ``_rev`` so callers never hold engine-specific objects.
+    """
+
+    name = "base"
+    # Remote backends get per-call timeouts; local ones are called inline
+    remote = False
+
+    @property
+    def configured(self):
+        """Whether the backend has what it needs to attempt a connection"""
+        return True
+
+    def connect(self):
+        """Open the underlying connection, returning True on success"""
+        raise NotImplementedError
+
+    @property
+    def connected(self):
+        """Whether the backend is ready to serve requests"""
+        raise NotImplementedError
+
+    def get(self, doc_id):
+        """Return the document with the given id, or None"""
+        raise NotImplementedError
+
+    def save(self, doc):
+        """Insert or update a single document"""
+        raise NotImplementedError
+
+    def save_many(self, docs):
+        """Insert or update several documents in one round trip"""
+        raise NotImplementedError
+
+    def delete(self, doc_id):
+        """Delete a document, returning True if it existed"""
+        raise NotImplementedError
+
+    def find_by_email(self, email):
+        """Return the first document with the given email, or None"""
+        raise NotImplementedError
+
+    def find_by_type(self, doc_type, limit=100):
+        """Return up to ``limit`` documents of the given type"""
+        raise NotImplementedError
+
+    def find_by_id_prefix(self, prefix, limit=20, before=None):
+        """Return up to ``limit`` documents whose id starts with ``prefix``, highest id first
+
+        Only ids below ``before`` are returned when it is given, so the last id
+        of one page is the cursor for the next. Served by the primary key index.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the underlying connection"""
+
+    def after_fork(self):
+        """Abandon connections inherited from the parent process"""
+
+
+class CloudantStorage(StorageBackend):
+    """Cloudant-backed document store"""
+
+    name = "cloudant"
+    remote = True
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, timeout=None):
+        self.db_name = db_name
+        self.timeout = timeout
+        self.client = None
+        self.db = None
+
+    @property
+    def configured(self):
+        return bool(os.getenv('CLOUDANT_APIKEY') and os.getenv('CLOUDANT_USERNAME')
+                    and (os.getenv('CLOUDANT_URL') or os.getenv('CLOUDANT_HOST')))
+
+    @property
+    def connected(self):
+        return self.db is not None
+
+    def connect(self):
+        """Connect to Cloudant database"""
+        # Imported here so the SQLite engine works without the Cloudant client installed
+        from cloudant import Cloudant
+        from cloudant.error import CloudantException
+
+        try:
+            # Get Cloudant credentials from environment
+            api_key = os.getenv('CLOUDANT_APIKEY')
+            host = os.getenv('CLOUDANT_HOST')
+            username = os.getenv('CLOUDANT_USERNAME')
+            url = os.getenv('CLOUDANT_URL') or (f"https://{host}" if host else None)
+
+            if not all([api_key, url, username]):
+                logger.warning("Cloudant credentials not found. Database operations will be disabled.")
+                return False
+
+            # Connect to Cloudant; the client timeout bounds every HTTP request it makes.
+            # The account name must be None or the client ignores url and builds its own.
+            client_kwargs = {'timeout': self.timeout} if self.timeout else {}
+            self.client = Cloudant.iam(None, api_key, url=url, **client_kwargs)
+            self.client.connect()
+
+            # Get or create database
+            if self.db_name in self.client.all_dbs():
+                self.db = self.client[self.db_name]
+            else:
+                self.db = self.client.create_database(self.db_name)
+                logger.info(f"Created database: {self.db_name}")
+
+            # Create the email index once instead of on every lookup
+            if 'email_index' not in [idx.get('name') for idx in self.db.get_query_indexes(raw_result=True).get('indexes', [])]:
+                self.db.create_query_index(index_name='email_index', fields=['email'])
+
+            logger.info("Successfully connected to Cloudant database")
+            return True
+
+        except CloudantException as e:
+            logger.error(f"Cloudant connection failed: {e}")
+            return False
+
+    # Documents are handled through standalone Document objects: indexing the
+    # database returns stale locally cached copies and create_document caches
+    # every document it writes, growing without bound in a long-lived process.
+    def get(self, doc_id):
+        from cloudant.document import Document
+        from requests.exceptions import HTTPError
+        doc = Document(self.db, doc_id)
+        try:
+            doc.fetch()
+        except HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+        return dict(doc)
+
+    def save(self, doc):
+        from cloudant.document import Document
+        saved = Document(self.db, doc.get('_id'))
+        saved.update(doc)
+        # create() would strip _rev and fail with a conflict on existing documents
+        if doc.get('_rev'):
+            saved.save()
+        else:
+            saved.create()
+        return dict(saved)
+
+    def save_many(self, docs):
+        results = self.db.bulk_docs(docs)
+        saved = []
+        for doc, result in zip(docs, results):
+            if result.get('error'):
+                logger.error(f"Bulk save failed for {result.get('id')}: {result.get('reason')}")
+                continue
+            saved.append(dict(doc, _id=result['id'], _rev=result['rev']))
+        return saved
+
+    def delete(self, doc_id):
+        from cloudant.document import Document
+        doc = self.get(doc_id)
+        if doc is None:
+            return False
+        existing = Document(self.db, doc_id)
+        existing.update(doc)
+        existing.delete()
+        return True
+
+    def find_by_email(self, email):
+        docs = self.db.get_query_result({'email': email}, raw_result=True, limit=1).get('docs', [])
+        return docs[0] if docs else None
+
+    def find_by_type(self, doc_type, limit=100):
+        return self.db.get_query_result({'type': doc_type}, raw_result=True, limit=limit).get('docs', [])
+
+    def find_by_id_prefix(self, prefix, limit=20, before=None):
+        # _all_docs walks the primary index; descending order swaps start and end keys.
+        # startkey is inclusive, so one extra row is read in case it is ``before`` itself.
+        if before is not None and before <= prefix:
+            return []
+        result = self.db.all_docs(
+            startkey=id_prefix_upper_bound(prefix, before),
+            endkey=prefix,
+            descending=True,
+            include_docs=True,
+            limit=limit + 1
+        )
+        docs = [row['doc'] for row in result.get('rows', []) if row.get('doc') and row['id'] != before]
+        return docs[:limit]
+
+    def close(self):
+        if self.client:
+            self.client.disconnect()
+
+    def after_fork(self):
+        # The parent's HTTP session is left alone; the child reconnects with its own
+        self.client = None
+        self.db = None
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite-backed document store
+
+    Documents are stored as JSON with ``email`` and ``type`` promoted to indexed
+    columns. A path of ``:memory:`` gives a private in-memory database, which is
+    handy for offline benchmarking of the login path.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS documents ("
+        " id TEXT PRIMARY KEY,"
+        " rev INTEGER NOT NULL,"
+        " type TEXT,"
+        " email TEXT,"
+        " body TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_email ON documents(email)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(type)",
+    )
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.in_memory = path == ':memory:'
+        self._local = threading.local()
+        # An in-memory database only exists on its own connection, so it is shared under a lock
+        self._shared = None
+        self._lock = threading.RLock() if self.in_memory else nullcontext()
+        self._ready = False
+
+    @property
+    def connected(self):
+        return self._ready
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=not self.in_memory, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self.in_memory:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _conn(self):
+        if self.in_memory:
+            return self._shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def connect(self):
+        """Open the SQLite database and create the schema"""
+        try:
+            if self.in_memory:
+                self._shared = self._open()
+            conn = self._conn()
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._ready = True
+            logger.info(f"Using SQLite storage at {self.path}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"SQLite connection failed: {e}")
+            return False
+
+    @staticmethod
+    def _row_to_doc(row):
+        doc = json.loads(row['body'])
+        doc['_id'] = row['id']
+        doc['_rev'] = f"{row['rev']}-sqlite"
+        return doc
+
+    def _upsert(self, conn, doc):
+        doc_id = doc['_id']
+        body = {k: v for k, v in doc.items() if k not in ('_id', '_rev')}
+        row = conn.execute("SELECT rev FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        rev = (row['rev'] if row else 0) + 1
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (id, rev, type, email, body) VALUES (?, ?, ?, ?, ?)",
+            (doc_id, rev, body.get('type'), body.get('email'), json.dumps(body, default=str))
+        )
+        return dict(body, _id=doc_id, _rev=f"{rev}-sqlite")
+
+    def get(self, doc_id):
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT id, rev, body FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        return self._row_to_doc(row) if row else None
+
+    def save(self, doc):
+        return self.save_many([doc])[0]
+
+    def save_many(self, docs):
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                saved = [self._upsert(conn, doc) for doc in docs]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return saved
+
+    def delete(self, doc_id):
+        with self._lock:
+            cursor = self._conn().execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return cursor.rowcount > 0
+
+    def find_by_email(self, email):
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT id, rev, body FROM documents WHERE email = ? LIMIT 1", (email,)
+            ).fetchone()
+        return self._row_to_doc(row) if row else None
+
+    def find_by_type(self, doc_type, limit=100):
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT id, rev, body FROM documents WHERE type = ? LIMIT ?", (doc_type, limit)
+            ).fetchall()
+        return [self._row_to_doc(row) for row in rows]
+
+    def find_by_id_prefix(self, prefix, limit=20, before=None):
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT id, rev, body FROM documents WHERE id >= ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (prefix, id_prefix_upper_bound(prefix, before), limit)
+            ).fetchall()
+        return [self._row_to_doc(row) for row in rows]
+
+    def close(self):
+        conn = self._shared if self.in_memory else getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._shared = None
+        self._local = threading.local()
+        self._ready = False
+
+    def after_fork(self):
+        if self.in_memory:
+            # The child owns its copy of an in-memory database; only the lock needs renewing
+            self._lock = threading.RLock()
+        else:
+            # SQLite handles must not cross fork; drop them unclosed so the parent's locks are untouched
+            self._local = threading.local()
+
+
+def create_storage_backend(kind=None):
+    """Build the storage backend selected by the DATABASE_BACKEND env var
+
+    Supported values are ``cloudant`` (default), ``sqlite`` (file at SQLITE_PATH)
+    and ``memory`` (private in-memory SQLite database).
+    """
+    kind = (kind or os.getenv('DATABASE_BACKEND', 'cloudant')).lower()
+    if kind == 'sqlite':
+        return SQLiteStorage(os.getenv('SQLITE_PATH', f"{DEFAULT_DB_NAME}.db"))
+    if kind == 'memory':
+        return SQLiteStorage(':memory:')
+    if kind != 'cloudant':
+        logger.warning(f"Unknown DATABASE_BACKEND '{kind}', falling back to Cloudant")
+    return CloudantStorage(timeout=float(os.getenv('CLOUDANT_TIMEOUT', '5')))
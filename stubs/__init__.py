@@ -0,0 +1,4 @@
+"""
+Offline stand-ins for external services
+Small HTTP servers that mimic the remote APIs the app talks to, for tests and benchmarks
+"""
@@ -0,0 +1,66 @@
+"""
+Shared plumbing for the stub servers
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler with JSON helpers and keep-alive support"""
+
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def route(self):
+        return urlsplit(self.path).path
+
+    @property
+    def query(self):
+        return {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def read_json(self):
+        body = self.read_body()
+        return json.loads(body) if body else {}
+
+    def read_form(self):
+        return {k: v[0] for k, v in parse_qs(self.read_body().decode()).items()}
+
+    def send_json(self, body, status=200, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Stubs run under load; keep them quiet
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded server that ignores clients hanging up early (e.g. on timeout)"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        import sys
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_server(handler_class, host='127.0.0.1', port=0):
+    """Serve ``handler_class`` on a daemon thread and return the server"""
+    server = StubServer((host, port), handler_class)
+    threading.Thread(target=server.serve_forever, name=handler_class.__name__, daemon=True).start()
+    return server
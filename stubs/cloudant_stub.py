@@ -0,0 +1,216 @@
+"""
+Cloudant stub server
+
+Implements the slice of the IBM IAM and CouchDB/Cloudant HTTP APIs the
+python-cloudant client uses, backed by in-memory dicts:
+
+    python -m stubs.cloudant_stub --port 9300 --delay 0.01
+
+Point the app at it with:
+
+    DATABASE_BACKEND=cloudant CLOUDANT_URL=http://127.0.0.1:9300
+    CLOUDANT_USERNAME=stub CLOUDANT_APIKEY=stub
+    IAM_TOKEN_URL=http://127.0.0.1:9300/identity/token
+"""
+
+import json
+import time
+import uuid
+import threading
+import argparse
+from urllib.parse import unquote
+from stubs.base import StubHandler, start_server
+
+
+class CouchStore:
+    """Databases of documents with CouchDB-style revisions"""
+
+    def __init__(self):
+        self.databases = {}
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def put(self, db, doc):
+        """Create or update ``doc``; returns (status, result) like CouchDB"""
+        docs = self.databases[db]
+        doc_id = doc.get('_id') or uuid.uuid4().hex
+        with self.lock:
+            current = docs.get(doc_id)
+            if current is not None and doc.get('_rev') != current['_rev']:
+                return 409, {'id': doc_id, 'error': 'conflict', 'reason': 'Document update conflict.'}
+            if current is None and doc.get('_rev'):
+                return 409, {'id': doc_id, 'error': 'conflict', 'reason': 'Document update conflict.'}
+            generation = int(current['_rev'].split('-')[0]) + 1 if current else 1
+            rev = f"{generation}-{uuid.uuid4().hex}"
+            docs[doc_id] = dict(doc, _id=doc_id, _rev=rev)
+        return 201, {'ok': True, 'id': doc_id, 'rev': rev}
+
+    def all_docs(self, db, params):
+        """Primary index scan honouring startkey, endkey, descending, limit and include_docs"""
+        descending = params.get('descending') == 'true'
+        start = json.loads(params['startkey']) if 'startkey' in params else None
+        end = json.loads(params['endkey']) if 'endkey' in params else None
+        low, high = (end, start) if descending else (start, end)
+        ids = sorted(self.databases[db], reverse=descending)
+        ids = [i for i in ids if (low is None or i >= low) and (high is None or i <= high)]
+        if 'limit' in params:
+            ids = ids[:int(params['limit'])]
+        docs = self.databases[db]
+        rows = []
+        for doc_id in ids:
+            row = {'id': doc_id, 'key': doc_id, 'value': {'rev': docs[doc_id]['_rev']}}
+            if params.get('include_docs') == 'true':
+                row['doc'] = docs[doc_id]
+            rows.append(row)
+        return {'total_rows': len(docs), 'offset': 0, 'rows': rows}
+
+    def find(self, db, selector, limit, skip=0):
+        """Equality-only Mango query"""
+        matches = [
+            doc for doc in list(self.databases[db].values())
+            if all(doc.get(field) == value for field, value in selector.items())
+        ]
+        return matches[skip:skip + limit]
+
+
+class CloudantStubHandler(StubHandler):
+    store = None
+    delay = 0.0
+
+    def _parts(self):
+        return [unquote(part) for part in self.route.strip('/').split('/') if part]
+
+    def _db_or_404(self, name):
+        if name not in self.store.databases:
+            self.send_json({'error': 'not_found', 'reason': 'Database does not exist.'}, status=404)
+            return False
+        return True
+
+    def _head_status(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        time.sleep(self.delay)
+        parts = self._parts()
+        if len(parts) == 1:
+            return self._head_status(200 if parts[0] in self.store.databases else 404)
+        if len(parts) == 2:
+            found = parts[0] in self.store.databases and parts[1] in self.store.databases[parts[0]]
+            return self._head_status(200 if found else 404)
+        self._head_status(404)
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        parts = self._parts()
+        if not parts:
+            return self.send_json({'couchdb': 'Welcome', 'version': '2.1.1', 'vendor': {'name': 'stub'}})
+        if parts == ['_all_dbs']:
+            return self.send_json(sorted(self.store.databases))
+        if parts == ['_iam_session']:
+            return self.send_json({'ok': True, 'info': {'authenticated': 'cookie'}, 'userCtx': {'name': 'stub'}})
+        if not self._db_or_404(parts[0]):
+            return
+        if len(parts) == 1:
+            return self.send_json({'db_name': parts[0], 'doc_count': len(self.store.databases[parts[0]])})
+        if parts[1] == '_index':
+            return self.send_json({'total_rows': len(self.store.indexes[parts[0]]), 'indexes': self.store.indexes[parts[0]]})
+        if parts[1] == '_all_docs':
+            return self.send_json(self.store.all_docs(parts[0], self.query))
+        doc = self.store.databases[parts[0]].get(parts[1])
+        if doc is None:
+            return self.send_json({'error': 'not_found', 'reason': 'missing'}, status=404)
+        self.send_json(doc)
+
+    def do_PUT(self):
+        time.sleep(self.delay)
+        parts = self._parts()
+        if len(parts) == 1:
+            if parts[0] in self.store.databases:
+                return self.send_json({'error': 'file_exists'}, status=412)
+            self.store.databases[parts[0]] = {}
+            self.store.indexes[parts[0]] = []
+            return self.send_json({'ok': True}, status=201)
+        if not self._db_or_404(parts[0]):
+            return
+        doc = dict(self.read_json(), _id=parts[1])
+        status, result = self.store.put(parts[0], doc)
+        self.send_json(result, status=status)
+
+    def do_POST(self):
+        time.sleep(self.delay)
+        parts = self._parts()
+        if parts == ['identity', 'token']:
+            self.read_body()
+            return self.send_json({
+                'access_token': f"iam-{uuid.uuid4().hex}", 'token_type': 'Bearer',
+                'expires_in': 3600, 'expiration': int(time.time()) + 3600
+            })
+        if parts == ['_iam_session']:
+            self.read_body()
+            return self.send_json({'ok': True}, headers={
+                'Set-Cookie': f"IAMSession={uuid.uuid4().hex}; Max-Age=3600; Path=/; HttpOnly"
+            })
+
+        body = self.read_json()
+        if not parts or not self._db_or_404(parts[0]):
+            return
+        db = parts[0]
+        if len(parts) == 1:
+            status, result = self.store.put(db, body)
+            return self.send_json(result, status=status)
+        if parts[1] == '_bulk_docs':
+            results = []
+            for doc in body.get('docs', []):
+                _, result = self.store.put(db, doc)
+                results.append(result)
+            return self.send_json(results, status=201)
+        if parts[1] == '_find':
+            docs = self.store.find(db, body.get('selector', {}), int(body.get('limit', 25)), int(body.get('skip', 0)))
+            return self.send_json({'docs': docs, 'bookmark': 'nil'})
+        if parts[1] == '_index':
+            name = body.get('name') or uuid.uuid4().hex
+            self.store.indexes[db].append({'ddoc': f"_design/{name}", 'name': name, 'type': 'json', 'def': body.get('index', {})})
+            return self.send_json({'result': 'created', 'id': f"_design/{name}", 'name': name})
+        self.send_json({'error': 'not_found'}, status=404)
+
+    def do_DELETE(self):
+        time.sleep(self.delay)
+        parts = self._parts()
+        if len(parts) != 2 or not self._db_or_404(parts[0]):
+            return self.send_json({'error': 'not_found'}, status=404)
+        docs = self.store.databases[parts[0]]
+        with self.store.lock:
+            current = docs.get(parts[1])
+            if current is None:
+                return self.send_json({'error': 'not_found', 'reason': 'missing'}, status=404)
+            if self.query.get('rev') != current['_rev']:
+                return self.send_json({'error': 'conflict'}, status=409)
+            del docs[parts[1]]
+        self.send_json({'ok': True, 'id': parts[1], 'rev': current['_rev']})
+
+
+def serve(port=0, delay=0.0):
+    """Start the stub on a background thread and return the server"""
+    handler = type('ConfiguredCloudantStubHandler', (CloudantStubHandler,), {'store': CouchStore(), 'delay': delay})
+    return start_server(handler, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=9300)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before answering')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay)
+    print(f"Cloudant stub listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
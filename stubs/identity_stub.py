@@ -0,0 +1,148 @@
+"""
+Google OAuth and IBM Cloud App ID stub server
+
+Serves both identity providers from one port so the login flows can run
+offline. Every authorization code is accepted and names the user it signs in
+(``code=alice`` signs in alice@example.com), and App ID ID tokens are real
+RS256 JWTs signed with a key generated at startup:
+
+    python -m stubs.identity_stub --port 9200 --delay 0.05
+
+Point the app at it with:
+
+    GOOGLE_TOKEN_URL=http://127.0.0.1:9200/google/token
+    GOOGLE_USERINFO_URL=http://127.0.0.1:9200/google/userinfo
+    APPID_DISCOVERY_ENDPOINT=http://127.0.0.1:9200/appid/.well-known/openid-configuration
+    APPID_CLIENT_ID=stub-client
+"""
+
+import json
+import time
+import uuid
+import argparse
+from urllib.parse import urlencode
+from stubs.base import StubHandler, start_server
+
+KEY_ID = 'stub-key-1'
+
+
+def generate_signing_key():
+    """RSA key pair for ID tokens, with the public half as a JWK"""
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+    jwk.update(kid=KEY_ID, alg='RS256', use='sig')
+    return key, jwk
+
+
+def user_for_code(code):
+    name = code or 'user'
+    return {'id': f"stub-{name}", 'email': f"{name}@example.com", 'name': name.title()}
+
+
+class IdentityStubHandler(StubHandler):
+    delay = 0.0
+    private_key = None
+    jwk = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.route == '/appid/.well-known/openid-configuration':
+            base = f"{self.base_url}/appid"
+            return self.send_json({
+                'issuer': base,
+                'authorization_endpoint': f"{base}/authorization",
+                'token_endpoint': f"{base}/token",
+                'jwks_uri': f"{base}/publickeys",
+                'userinfo_endpoint': f"{base}/userinfo",
+                'id_token_signing_alg_values_supported': ['RS256']
+            })
+        if self.route == '/appid/publickeys':
+            return self.send_json({'keys': [self.jwk]})
+        if self.route == '/appid/authorization':
+            # Consent is implied: send the browser straight back with a code
+            params = self.query
+            code = params.get('login_hint') or f"appid{uuid.uuid4().hex[:8]}"
+            location = f"{params.get('redirect_uri')}?{urlencode({'code': code, 'state': params.get('state', '')})}"
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.route == '/google/userinfo':
+            token = self.headers.get('Authorization', '').replace('Bearer ', '', 1)
+            if not token.startswith('google-'):
+                return self.send_json({'error': 'invalid_token'}, status=401)
+            user = user_for_code(token[len('google-'):])
+            return self.send_json(dict(user, verified_email=True, picture=None))
+        self.send_json({'error': 'not_found'}, status=404)
+
+    def do_POST(self):
+        time.sleep(self.delay)
+        form = self.read_form()
+        if self.route == '/google/token':
+            return self.send_json({
+                'access_token': f"google-{form.get('code', 'user')}",
+                'token_type': 'Bearer',
+                'expires_in': 3599
+            })
+        if self.route == '/appid/token':
+            return self.send_json({
+                'access_token': f"appid-{uuid.uuid4().hex}",
+                'id_token': self.id_token(form.get('code'), form.get('client_id')),
+                'token_type': 'Bearer',
+                'expires_in': 3600
+            })
+        self.send_json({'error': 'not_found'}, status=404)
+
+    def id_token(self, code, client_id):
+        import jwt
+
+        user = user_for_code(code)
+        now = int(time.time())
+        claims = {
+            'iss': f"{self.base_url}/appid",
+            'aud': client_id,
+            'sub': user['id'],
+            'email': user['email'],
+            'name': user['name'],
+            'email_verified': True,
+            'iat': now,
+            'exp': now + 3600
+        }
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': KEY_ID})
+
+
+def serve(port=0, delay=0.0):
+    """Start the stub on a background thread and return the server"""
+    private_key, jwk = generate_signing_key()
+    handler = type('ConfiguredIdentityStubHandler', (IdentityStubHandler,), {
+        'delay': delay, 'private_key': private_key, 'jwk': jwk
+    })
+    return start_server(handler, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before answering')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay)
+    print(f"Identity stub listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
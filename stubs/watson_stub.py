@@ -0,0 +1,74 @@
+"""
+Watson Assistant v2 stub server
+
+Answers stateless message calls with canned replies after a configurable delay
+and failure rate, so the Watson chatbot mode can be exercised offline:
+
+    python -m stubs.watson_stub --port 9100 --delay 0.2 --error-rate 0.05
+
+Point the app at it with:
+
+    CHATBOT_BACKEND=watson ASSISTANT_ID=stub ASSISTANT_AUTH_TYPE=noauth
+    ASSISTANT_URL=http://127.0.0.1:9100
+"""
+
+import re
+import time
+import random
+import argparse
+from stubs.base import StubHandler, start_server
+
+MESSAGE_ROUTE = re.compile(r'^/v2/assistants/([^/]+)/message$')
+
+
+class WatsonStubHandler(StubHandler):
+    delay = 0.0
+    error_rate = 0.0
+
+    def do_POST(self):
+        body = self.read_json()
+        match = MESSAGE_ROUTE.match(self.route)
+        if not match:
+            return self.send_json({'error': 'Not found', 'code': 404}, status=404)
+
+        time.sleep(self.delay)
+        if random.random() < self.error_rate:
+            return self.send_json({'error': 'Service unavailable', 'code': 503}, status=503)
+
+        text = body.get('input', {}).get('text', '')
+        context = body.get('context') or {}
+        turns = context.get('skills', {}).get('main skill', {}).get('user_defined', {}).get('turns', 0) + 1
+        self.send_json({
+            'output': {
+                'generic': [{'response_type': 'text', 'text': f"[stub assistant {match.group(1)}] You said: {text}"}],
+                'intents': [],
+                'entities': []
+            },
+            'context': {'skills': {'main skill': {'user_defined': {'turns': turns}}}}
+        })
+
+
+def serve(port=0, delay=0.0, error_rate=0.0):
+    """Start the stub on a background thread and return the server"""
+    handler = type('ConfiguredWatsonStubHandler', (WatsonStubHandler,), {'delay': delay, 'error_rate': error_rate})
+    return start_server(handler, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 503')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay, args.error_rate)
+    print(f"Watson Assistant stub listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
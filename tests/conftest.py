@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """Stands in for time.time or time.monotonic; only moves when ``now`` is changed"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Factory that replaces ``module.time.<name>`` with a FakeClock for the test and returns it"""
+    def install(module, name='monotonic', start=1000.0):
+        clock = FakeClock(start)
+        monkeypatch.setattr(module.time, name, clock)
+        return clock
+    return install
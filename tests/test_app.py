@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import runpy
+
+import pytest
+
+import app as application
+from ratelimit import create_admission_controller
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def gunicorn_threads(monkeypatch):
+    """Thread count of the shipped gunicorn config with no overrides"""
+    for name in ('GUNICORN_THREADS', 'RATE_LIMIT_ENABLED', 'MAX_IN_FLIGHT_REQUESTS',
+                 'MAX_IN_FLIGHT_PREDICT', 'MAX_IN_FLIGHT_CHATBOT', 'MAX_IN_FLIGHT_OAUTH'):
+        monkeypatch.delenv(name, raising=False)
+    # Keep the config's setdefault() calls from leaking into other tests
+    for name in ('SESSION_BACKEND', 'CHAT_STORE', 'WARM_ON_START'):
+        monkeypatch.setenv(name, os.environ.get(name, ''))
+    return runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))['threads']
+
+
+def test_caps_shed_load_at_gunicorn_concurrency(gunicorn_threads):
+    assert application.REQUEST_THREADS == gunicorn_threads
+    controller = create_admission_controller(
+        application.ADMISSION_BUDGETS, max_in_flight=application.REQUEST_SLOTS
+    )
+
+    # With every request thread busy predicting, the last request is refused rather than queued
+    results = [controller.admit('predict', lambda i=i: f'ip:{i}') for i in range(gunicorn_threads)]
+    assert all(rejection is None for _, rejection in results[:-1])
+    assert results[-1][1].status == 503
+    for slots, _ in results[:-1]:
+        controller.release(slots)
+
+    # A chat flood leaves threads for predictions
+    chats = [controller.admit('chatbot_message', lambda i=i: f'ip:{i}') for i in range(gunicorn_threads)]
+    held = [slots for slots, rejection in chats if rejection is None]
+    assert len(held) < gunicorn_threads - 1
+    assert controller.admit('predict', lambda: 'ip:predict')[1] is None
+
+
+def test_chat_cannot_fill_request_threads():
+    chat_cap = application.ADMISSION_BUDGETS['chatbot'][2]
+    assert chat_cap < application.REQUEST_THREADS or application.REQUEST_THREADS == 1
+    # Every admitted chat request can have a Watson call without waiting for the pool
+    assert application.WATSON_MAX_WORKERS == chat_cap
+
+
+def request_seconds(route):
+    for series in application.HTTP_REQUEST_SECONDS.snapshot():
+        if series['labels']['route'] == route:
+            return series['count'], series['sum']
+    return 0, 0.0
+
+
+def test_streamed_response_latency_covers_the_body(monkeypatch):
+    def slow_reply(message, conversation):
+        time.sleep(0.2)
+        return 'A slow reply', 'local'
+
+    monkeypatch.setattr(application, 'generate_chatbot_reply', slow_reply)
+    monkeypatch.setattr(application.admission_controller, 'exempt', {'chatbot_message_stream'})
+    count, total = request_seconds('/chatbot/message/stream')
+
+    response = application.app.test_client().post('/chatbot/message/stream', json={'message': 'hello'})
+    assert 'A slow reply' in ''.join(
+        json.loads(line[len('data: '):]).get('text', '') for line in response.text.splitlines() if line.startswith('data: ')
+    )
+
+    # WSGI servers close the body once it is sent
+    response.close()
+
+    new_count, new_total = request_seconds('/chatbot/message/stream')
+    assert new_count == count + 1
+    assert new_total - total >= 0.2
+
+
+def test_streamed_chat_holds_its_slot_until_sent(monkeypatch):
+    budget = application.admission_controller.budgets['chatbot_message_stream']
+    seen = []
+
+    def reply(message, conversation):
+        seen.append(budget.concurrency.in_flight)
+        return 'A reply', 'local'
+
+    monkeypatch.setattr(application, 'generate_chatbot_reply', reply)
+    response = application.app.test_client().post('/chatbot/message/stream', json={'message': 'hello'})
+    response.get_data()
+    assert seen == [1]
+    response.close()
+    assert budget.concurrency.in_flight == 0
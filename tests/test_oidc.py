@@ -0,0 +1,176 @@
+import time
+
+import jwt
+import pytest
+
+from oidc import JWKSCache, OIDCProvider, TokenVerificationError
+from stubs.identity_stub import KEY_ID, generate_signing_key
+
+ISSUER = 'https://appid.example.com/oauth/v4/tenant'
+CLIENT_ID = 'test-client'
+
+
+class StaticDocument:
+    """Stands in for a CachedJSONDocument: serves ``value``, and ``latest`` once refreshed"""
+
+    def __init__(self, value, latest=None):
+        self.value = value
+        self.latest = latest if latest is not None else value
+        self.refreshes = 0
+
+    def get(self):
+        return self.value
+
+    def refresh(self):
+        self.refreshes += 1
+        self.value = self.latest
+        return self.value
+
+
+@pytest.fixture(scope='module')
+def signing_key():
+    return generate_signing_key()
+
+
+@pytest.fixture(scope='module')
+def other_key():
+    return generate_signing_key()
+
+
+def make_provider(jwks, latest_jwks=None):
+    provider = OIDCProvider(None, CLIENT_ID)
+    provider.discovery = StaticDocument({'issuer': ISSUER, 'token_endpoint': 'https://appid.example.com/token'})
+    provider.jwks = JWKSCache(StaticDocument(jwks, latest_jwks))
+    return provider
+
+
+@pytest.fixture
+def provider(signing_key):
+    return make_provider({'keys': [signing_key[1]]})
+
+
+def make_token(private_key, kid=KEY_ID, **claims):
+    now = int(time.time())
+    payload = {'iss': ISSUER, 'aud': CLIENT_ID, 'sub': 'stub-alice', 'email': 'alice@example.com',
+               'iat': now, 'exp': now + 3600}
+    payload.update(claims)
+    return jwt.encode(payload, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+def test_valid_token(provider, signing_key):
+    claims = provider.verify_id_token(make_token(signing_key[0]))
+    assert claims['sub'] == 'stub-alice'
+
+
+def test_bad_signature(provider, other_key):
+    with pytest.raises(TokenVerificationError, match='Signature'):
+        provider.verify_id_token(make_token(other_key[0]))
+
+
+def test_wrong_audience(provider, signing_key):
+    with pytest.raises(TokenVerificationError, match='[Aa]udience'):
+        provider.verify_id_token(make_token(signing_key[0], aud='another-client'))
+
+
+def test_wrong_issuer(provider, signing_key):
+    with pytest.raises(TokenVerificationError, match='[Ii]ssuer'):
+        provider.verify_id_token(make_token(signing_key[0], iss='https://evil.example.com'))
+
+
+def test_expiry_within_leeway_is_accepted(provider, signing_key):
+    token = make_token(signing_key[0], exp=int(time.time()) - 20)
+    assert provider.verify_id_token(token, leeway=30)['sub'] == 'stub-alice'
+
+
+def test_expiry_beyond_leeway_is_rejected(provider, signing_key):
+    token = make_token(signing_key[0], exp=int(time.time()) - 40)
+    with pytest.raises(TokenVerificationError, match='expired'):
+        provider.verify_id_token(token, leeway=30)
+
+
+def test_malformed_token(provider):
+    with pytest.raises(TokenVerificationError, match='Malformed'):
+        provider.verify_id_token('not-a-token')
+
+
+def test_unknown_kid_refreshes_once_and_finds_rotated_key(signing_key, other_key):
+    rotated = dict(other_key[1], kid='rotated-key')
+    provider = make_provider({'keys': [signing_key[1]]}, {'keys': [signing_key[1], rotated]})
+
+    claims = provider.verify_id_token(make_token(other_key[0], kid='rotated-key'))
+    assert claims['sub'] == 'stub-alice'
+    assert provider.jwks.document.refreshes == 1
+
+    # The rotated key is now cached
+    provider.verify_id_token(make_token(other_key[0], kid='rotated-key'))
+    assert provider.jwks.document.refreshes == 1
+
+
+def test_unknown_kid_refreshes_once_and_fails(provider, other_key):
+    token = make_token(other_key[0], kid='unknown-key')
+    with pytest.raises(TokenVerificationError, match='Unknown signing key'):
+        provider.verify_id_token(token)
+    assert provider.jwks.document.refreshes == 1
+
+    # Further unknown keys do not force another fetch within min_refresh_interval
+    with pytest.raises(TokenVerificationError, match='Unknown signing key'):
+        provider.verify_id_token(token)
+    assert provider.jwks.document.refreshes == 1
+
+
+def test_missing_discovery_document(signing_key):
+    provider = make_provider({'keys': [signing_key[1]]})
+    provider.discovery = StaticDocument(None)
+    with pytest.raises(TokenVerificationError, match='Discovery'):
+        provider.verify_id_token(make_token(signing_key[0]))
+
+
+class TokenResponse:
+    def __init__(self, id_token):
+        self.id_token = id_token
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'access_token': 'access', 'id_token': self.id_token, 'refresh_token': 'refresh'}
+
+
+def sign_in_with(monkeypatch, provider, id_token):
+    import app as application
+
+    monkeypatch.setattr(application, 'APPID_DISCOVERY_ENDPOINT', f"{ISSUER}/.well-known/openid-configuration")
+    monkeypatch.setattr(application, 'appid_provider', provider)
+    monkeypatch.setattr(application.identity_http, 'post', lambda url, **kwargs: TokenResponse(id_token))
+    client = application.app.test_client()
+    with client.session_transaction() as session:
+        session['oauth_state'] = 'state-1'
+    response = client.get('/auth/callback?code=code-1&state=state-1')
+    # As a WSGI server would, which hands back the admission slot
+    response.close()
+    with client.session_transaction() as session:
+        return response, dict(session)
+
+
+def test_auth_callback_signs_in_with_valid_token(monkeypatch, provider, signing_key):
+    response, session = sign_in_with(monkeypatch, provider, make_token(signing_key[0]))
+    assert response.status_code == 302
+    assert response.location.endswith('/loading')
+    assert session['user']['sub'] == 'stub-alice'
+
+
+@pytest.mark.parametrize('claims', [{'aud': 'another-client'}, {'iss': 'https://evil.example.com'}, {'kid': 'unknown-key'}])
+def test_auth_callback_rejects_invalid_token(monkeypatch, provider, signing_key, claims):
+    claims = dict(claims)
+    token = make_token(signing_key[0], kid=claims.pop('kid', KEY_ID), **claims)
+    response, session = sign_in_with(monkeypatch, provider, token)
+    assert response.status_code == 302
+    assert response.location.endswith('/auth/error')
+    assert 'user' not in session
+    assert 'access_token' not in session and 'id_token' not in session
+
+
+def test_auth_callback_rejects_bad_signature(monkeypatch, provider, other_key):
+    response, session = sign_in_with(monkeypatch, provider, make_token(other_key[0]))
+    assert response.location.endswith('/auth/error')
+    assert 'user' not in session
@@ -0,0 +1,127 @@
+import pytest
+
+import ratelimit
+from ratelimit import AdmissionController, TokenBucketLimiter, create_admission_controller, parse_rate
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(ratelimit)
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    limiter = TokenBucketLimiter(rate=0.5, capacity=2)
+    assert limiter.acquire('a') == (True, 0.0)
+    assert limiter.acquire('a') == (True, 0.0)
+
+    allowed, wait = limiter.acquire('a')
+    assert not allowed
+    assert wait == pytest.approx(2.0)
+
+    clock.now += 1
+    allowed, wait = limiter.acquire('a')
+    assert not allowed
+    assert wait == pytest.approx(1.0)
+
+    clock.now += 1
+    assert limiter.acquire('a')[0]
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    limiter = TokenBucketLimiter(rate=1, capacity=2)
+    limiter.acquire('a')
+    clock.now += 100
+    assert limiter.acquire('a')[0]
+    assert limiter.acquire('a')[0]
+    assert not limiter.acquire('a')[0]
+
+
+def test_buckets_are_per_key_and_bounded(clock):
+    limiter = TokenBucketLimiter(rate=1, capacity=1, max_keys=4, stripes=1)
+    assert limiter.acquire('a')[0]
+    assert not limiter.acquire('a')[0]
+    assert limiter.acquire('b')[0]
+
+    for key in 'cdef':
+        limiter.acquire(key)
+    assert len(limiter) == 4
+    # 'a' was evicted, so it starts again with a full bucket
+    assert limiter.acquire('a')[0]
+
+
+def test_rate_limit_rejection_carries_retry_after(clock):
+    controller = AdmissionController()
+    controller.add_budget('predict', ['predict'], rate=0.25, capacity=1)
+    slots, rejection = controller.admit('predict', lambda: 'ip:1')
+    assert rejection is None
+
+    slots, rejection = controller.admit('predict', lambda: 'ip:1')
+    assert slots is None
+    assert (rejection.group, rejection.reason, rejection.status) == ('predict', 'rate_limited', 429)
+    assert rejection.retry_after == 4
+
+    clock.now += 3.5
+    _, rejection = controller.admit('predict', lambda: 'ip:1')
+    # Retry-After is rounded up to whole seconds
+    assert rejection.retry_after == 1
+
+
+def test_concurrency_caps_and_release():
+    controller = AdmissionController(max_in_flight=3, retry_after=2)
+    controller.add_budget('chatbot', ['chatbot_message'], max_in_flight=1)
+
+    held, rejection = controller.admit('chatbot_message', lambda: 'ip:1')
+    assert rejection is None
+    _, rejection = controller.admit('chatbot_message', lambda: 'ip:2')
+    assert (rejection.group, rejection.reason, rejection.status, rejection.retry_after) == ('chatbot', 'concurrency', 503, 2)
+    # The global slot taken before the budget refused is handed back
+    assert controller.global_cap.in_flight == 1
+
+    others = [controller.admit('index', lambda: 'ip:1')[0] for _ in range(2)]
+    _, rejection = controller.admit('index', lambda: 'ip:1')
+    assert (rejection.group, rejection.status) == ('global', 503)
+
+    controller.release(held)
+    for slots in others:
+        controller.release(slots)
+    assert controller.global_cap.in_flight == 0
+    assert controller.admit('chatbot_message', lambda: 'ip:2')[1] is None
+
+
+def test_exempt_endpoints_skip_every_check():
+    controller = AdmissionController(max_in_flight=1, exempt=['ready'])
+    controller.admit('index', lambda: 'ip:1')
+    assert controller.admit('ready', lambda: 'ip:1') == ([], None)
+
+
+def test_parse_rate():
+    assert parse_rate('30/60') == (0.5, 30)
+    assert parse_rate('5') == (5.0, 5)
+    assert parse_rate('0') == (None, None)
+    assert parse_rate('') == (None, None)
+
+
+def test_create_admission_controller_reads_settings(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'true')
+    monkeypatch.setenv('MAX_IN_FLIGHT_REQUESTS', '10')
+    monkeypatch.setenv('RATE_LIMIT_PREDICT', '6/60')
+    monkeypatch.setenv('MAX_IN_FLIGHT_PREDICT', '2')
+    monkeypatch.setenv('RATE_LIMIT_OAUTH', '0')
+    controller = create_admission_controller({
+        'predict': (('predict',), '30/60', 4),
+        'oauth': (('auth_callback',), '10/60', 8),
+    })
+
+    status = controller.status()
+    assert status['max_in_flight'] == 10
+    assert status['budgets']['predict']['rate_per_second'] == pytest.approx(0.1)
+    assert status['budgets']['predict']['burst'] == 6
+    assert status['budgets']['predict']['max_in_flight'] == 2
+    assert status['budgets']['oauth']['rate_per_second'] is None
+
+
+def test_create_admission_controller_disabled(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+    controller = create_admission_controller({'predict': (('predict',), '1/60', 1)})
+    for _ in range(5):
+        assert controller.admit('predict', lambda: 'ip:1')[1] is None
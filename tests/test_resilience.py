@@ -0,0 +1,72 @@
+import pytest
+
+import resilience
+from resilience import CircuitBreaker
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(resilience)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_after_reset_timeout(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 9.9
+    assert breaker.snapshot()['retry_in'] == pytest.approx(0.1)
+    assert not breaker.allow_request()
+
+    clock.now += 0.1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_half_open_success_closes(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['consecutive_failures'] == 0
+
+
+def test_half_open_failure_reopens(clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 9
+    assert not breaker.allow_request()
+
+
+def test_trip_opens_immediately(clock):
+    breaker = CircuitBreaker('test', failure_threshold=5, reset_timeout=10)
+    breaker.trip()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()['retry_in'] == 10
@@ -0,0 +1,115 @@
+import pytest
+from flask import Flask, session
+
+import session_store
+from session_store import MemorySessionStore, SQLiteSessionStore, ServerSideSessionInterface
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(session_store, 'time', start=1_000_000.0)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore(max_entries=3)
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+
+
+def test_get_returns_copy_until_expiry(store, clock):
+    data = {'user': {'email': 'a@example.com'}}
+    store.set('sid', data, ttl=60)
+    data['user']['email'] = 'changed'
+
+    found, expires_at = store.get('sid')
+    assert found == {'user': {'email': 'a@example.com'}}
+    assert expires_at == clock.now + 60
+
+    clock.now += 60
+    assert store.get('sid') is None
+
+
+def test_evict_expired_removes_only_expired(store, clock):
+    store.set('short', {'n': 1}, ttl=10)
+    store.set('long', {'n': 2}, ttl=100)
+    clock.now += 10
+
+    assert store.evict_expired() == 1
+    assert store.get('short') is None
+    assert store.get('long')[0] == {'n': 2}
+
+
+def test_delete(store):
+    store.set('sid', {'n': 1}, ttl=60)
+    store.delete('sid')
+    assert store.get('sid') is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_entries=2)
+    store.set('a', {}, ttl=60)
+    store.set('b', {}, ttl=60)
+    store.get('a')
+    store.set('c', {}, ttl=60)
+    assert store.get('b') is None
+    assert store.get('a') is not None
+    assert len(store) == 2
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSideSessionInterface(MemorySessionStore(), ttl=3600)
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return ''
+
+    @app.route('/login')
+    def login():
+        session.regenerate()
+        session['user'] = 'alice'
+        return ''
+
+    @app.route('/get')
+    def get_value():
+        return session.get('user') or session.get('value') or ''
+
+    return app
+
+
+def test_cookie_holds_only_signed_id(app):
+    client = app.test_client()
+    client.get('/set/secret-value')
+    cookie = client.get_cookie('session')
+    assert 'secret-value' not in cookie.value
+    assert client.get('/get').text == 'secret-value'
+
+
+def test_tampered_cookie_starts_new_session(app):
+    client = app.test_client()
+    client.get('/set/x')
+    client.set_cookie('session', client.get_cookie('session').value + 'x')
+    assert client.get('/get').text == ''
+
+
+def test_regenerate_rotates_id_and_drops_old_one(app):
+    client = app.test_client()
+    client.get('/set/before-login')
+    old_cookie = client.get_cookie('session').value
+    store = app.session_interface.store
+    assert len(store) == 1
+
+    client.get('/login')
+    new_cookie = client.get_cookie('session').value
+    assert new_cookie != old_cookie
+    assert client.get('/get').text == 'alice'
+    assert len(store) == 1
+
+    # Whoever knew the id from before login gets an empty session
+    attacker = app.test_client()
+    attacker.set_cookie('session', old_cookie)
+    assert attacker.get('/get').text == ''
@@ -0,0 +1,83 @@
+"""Settings in .env must reach everything app.py builds at import time"""
+
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the app with load_dotenv pointed at a test file and prints the requested expressions
+PROBE = """
+import sys, json, functools
+import dotenv
+dotenv.load_dotenv = functools.partial(dotenv.load_dotenv, dotenv_path=sys.argv[1])
+import app
+print(json.dumps({name: eval(expression, vars(app)) for name, expression in json.loads(sys.argv[2]).items()}))
+"""
+
+
+def import_app_with_dotenv(tmp_path, settings, probes):
+    dotenv_path = tmp_path / '.env'
+    dotenv_path.write_text(''.join(f"{key}={value}\n" for key, value in settings.items()))
+    # Values already in the environment win over .env, so leave these unset
+    env = {key: value for key, value in os.environ.items() if key not in settings}
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, str(dotenv_path), json.dumps(probes)],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_database_backend_from_dotenv(tmp_path):
+    path = tmp_path / 'documents.db'
+    found = import_app_with_dotenv(
+        tmp_path,
+        {'DATABASE_BACKEND': 'sqlite', 'SQLITE_PATH': path},
+        {'backend': 'db_manager.backend.name', 'path': 'db_manager.backend.path'}
+    )
+    assert found == {'backend': 'sqlite', 'path': str(path)}
+
+
+def test_database_resilience_from_dotenv(tmp_path):
+    found = import_app_with_dotenv(
+        tmp_path,
+        {
+            'DATABASE_BACKEND': 'memory', 'DB_CALL_TIMEOUT': '1', 'DB_CONNECT_RETRIES': '2',
+            'DB_BREAKER_THRESHOLD': '3', 'DB_BREAKER_RESET': '7', 'DB_MAX_WORKERS': '2'
+        },
+        {
+            'call_timeout': 'db_manager.call_timeout',
+            'connect_retries': 'db_manager.connect_retries',
+            'threshold': 'db_manager.breaker.failure_threshold',
+            'reset': 'db_manager.breaker.reset_timeout',
+            'workers': 'db_manager._executor.max_workers'
+        }
+    )
+    assert found == {'call_timeout': 1.0, 'connect_retries': 2, 'threshold': 3, 'reset': 7.0, 'workers': 2}
+
+
+def test_identity_client_from_dotenv(tmp_path):
+    found = import_app_with_dotenv(
+        tmp_path,
+        {
+            'DATABASE_BACKEND': 'memory', 'IDP_CONNECT_TIMEOUT': '0.5', 'IDP_READ_TIMEOUT': '1',
+            'IDP_POOL_SIZE': '3', 'IDP_RETRIES': '0'
+        },
+        {'timeout': 'identity_http.timeout', 'pool_size': 'identity_http.pool_size', 'retries': 'identity_http.retries'}
+    )
+    assert found == {'timeout': [0.5, 1.0], 'pool_size': 3, 'retries': 0}
+
+
+def test_logging_from_dotenv(tmp_path):
+    found = import_app_with_dotenv(
+        tmp_path,
+        {'DATABASE_BACKEND': 'memory', 'LOG_FORMAT': 'text', 'LOG_LEVEL': 'WARNING', 'LOG_BUFFER_SIZE': '50'},
+        {
+            'formatter': "type(__import__('logging_setup')._listener.handlers[0].formatter).__name__",
+            'level': 'logging.getLogger().level',
+            'buffer_size': "__import__('logging_setup')._listener.queue.maxsize"
+        }
+    )
+    assert found == {'formatter': 'Formatter', 'level': 30, 'buffer_size': 50}
@@ -0,0 +1,62 @@
+import pytest
+
+from storage import SQLiteStorage
+
+
+@pytest.fixture(params=[':memory:', 'file'])
+def storage(request, tmp_path):
+    path = request.param if request.param == ':memory:' else str(tmp_path / 'documents.db')
+    backend = SQLiteStorage(path)
+    assert backend.connect()
+    yield backend
+    backend.close()
+
+
+def test_save_assigns_revision_and_upserts(storage):
+    first = storage.save({'_id': 'user:1', 'type': 'user', 'email': 'a@example.com', 'name': 'A'})
+    assert first['_rev'] == '1-sqlite'
+
+    second = storage.save(dict(first, name='B'))
+    assert second['_rev'] == '2-sqlite'
+    assert storage.get('user:1') == second
+    assert storage.find_by_email('a@example.com')['name'] == 'B'
+    assert len(storage.find_by_type('user')) == 1
+
+
+def test_save_many_writes_every_document(storage):
+    saved = storage.save_many([{'_id': f'doc:{i}', 'type': 'note'} for i in range(3)])
+    assert [doc['_rev'] for doc in saved] == ['1-sqlite'] * 3
+    assert len(storage.find_by_type('note')) == 3
+
+
+def test_save_many_rolls_back_on_failure(storage):
+    with pytest.raises(Exception):
+        storage.save_many([{'_id': 'doc:ok'}, {'name': 'missing id'}])
+    assert storage.get('doc:ok') is None
+
+
+def test_delete(storage):
+    storage.save({'_id': 'doc:1'})
+    assert storage.delete('doc:1')
+    assert not storage.delete('doc:1')
+    assert storage.get('doc:1') is None
+
+
+def test_find_by_id_prefix_pages_newest_first(storage):
+    storage.save_many([{'_id': f'history:a:{i:03d}'} for i in range(5)])
+    storage.save_many([{'_id': 'history:b:000'}, {'_id': 'history:ab:000'}, {'_id': 'history:'}])
+
+    page = storage.find_by_id_prefix('history:a:', limit=2)
+    assert [doc['_id'] for doc in page] == ['history:a:004', 'history:a:003']
+
+    page = storage.find_by_id_prefix('history:a:', limit=2, before=page[-1]['_id'])
+    assert [doc['_id'] for doc in page] == ['history:a:002', 'history:a:001']
+
+    page = storage.find_by_id_prefix('history:a:', limit=2, before=page[-1]['_id'])
+    assert [doc['_id'] for doc in page] == ['history:a:000']
+
+
+def test_find_by_id_prefix_ignores_cursor_outside_prefix(storage):
+    storage.save_many([{'_id': 'history:a:001'}, {'_id': 'history:b:001'}])
+    page = storage.find_by_id_prefix('history:a:', before='history:z')
+    assert [doc['_id'] for doc in page] == ['history:a:001']
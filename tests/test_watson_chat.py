@@ -0,0 +1,56 @@
+import time
+import threading
+
+from watson_chat import WatsonChatBackend
+
+
+class SlowAssistant:
+    """Assistant whose calls block until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def message_stateless(self, assistant_id, input, **kwargs):
+        self.release.wait(5)
+        return self
+
+    def get_result(self):
+        return {
+            'output': {'generic': [{'response_type': 'text', 'text': 'from watson'}]},
+            'context': {'skills': {'turn': 1}}
+        }
+
+
+class Resource:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def test_full_pool_falls_back_immediately():
+    assistant = SlowAssistant()
+    backend = WatsonChatBackend(Resource(assistant), 'assistant', timeout=0.05, max_workers=1)
+
+    # The first call times out but keeps the only pool slot busy
+    assert backend.reply('first question', {}) is None
+
+    start = time.perf_counter()
+    assert backend.reply('second question', {}) is None
+    assert time.perf_counter() - start < 0.05
+    assert backend.status()['in_flight'] == 1
+
+    assistant.release.set()
+    backend._executor.shutdown(wait=True)
+    # The late reply was cached for the next asker
+    assert backend.reply('First question?', {}) == 'from watson'
+
+
+def test_reply_keeps_watson_context():
+    assistant = SlowAssistant()
+    assistant.release.set()
+    backend = WatsonChatBackend(Resource(assistant), 'assistant', timeout=1, max_workers=1)
+    context = {}
+    assert backend.reply('hello', context) == 'from watson'
+    assert context['watson'] == {'skills': {'turn': 1}}
@@ -0,0 +1,168 @@
+"""
+Watson Assistant chatbot backend
+Bounded, time-limited Watson calls with a response cache and local fallback
+"""
+
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from intents import tokenize
+from resilience import CircuitBreaker
+from metrics import REGISTRY, CACHE_LOOKUPS, register_cache
+
+logger = logging.getLogger(__name__)
+
+CHAT_BACKEND_SECONDS = REGISTRY.histogram(
+    'chat_backend_seconds', 'Latency of remote chatbot backend calls', ('backend', 'outcome')
+)
+CHAT_FALLBACKS = REGISTRY.counter('chat_fallbacks_total', 'Chatbot replies served locally instead of remotely', ('reason',))
+register_cache('chat_response')
+
+
+def normalize_question(message):
+    """Cache key for a message: lowercase word tokens joined by single spaces"""
+    return ' '.join(tokenize(message))
+
+
+class ResponseCache:
+    """LRU cache of replies with a per-entry TTL"""
+
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                CACHE_LOOKUPS.inc(cache='chat_response', result='hit')
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+        CACHE_LOOKUPS.inc(cache='chat_response', result='miss')
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class WatsonChatBackend:
+    """Asks Watson Assistant for replies without letting it hold request threads
+
+    Calls run on a small dedicated pool. A caller waits at most ``timeout``
+    seconds and gets None back on timeout, error, an open circuit or a full
+    pool, so the route can answer from local intents instead. A reply that
+    arrives after its caller gave up is still cached for the next asker.
+    """
+
+    def __init__(self, assistant_resource, assistant_id, timeout=2.5, max_workers=4, cache=None, breaker=None):
+        self.assistant_resource = assistant_resource
+        self.assistant_id = assistant_id
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cache = cache or ResponseCache()
+        self.breaker = breaker or CircuitBreaker('watson', failure_threshold=3, reset_timeout=30)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='watson')
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _ask(self, message, context):
+        """Blocking Watson call; runs on the backend pool"""
+        assistant = self.assistant_resource.get()
+        if assistant is None:
+            raise RuntimeError("Watson Assistant is not configured")
+        kwargs = {'context': context} if context else {}
+        result = assistant.message_stateless(
+            self.assistant_id,
+            input={'message_type': 'text', 'text': message},
+            **kwargs
+        ).get_result()
+        texts = [
+            item.get('text', '') for item in result.get('output', {}).get('generic', [])
+            if item.get('response_type') == 'text'
+        ]
+        return '\n\n'.join(t for t in texts if t), result.get('context')
+
+    def _run(self, key, message, context):
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            reply, new_context = self._ask(message, context)
+            self.breaker.record_success()
+            if reply:
+                self.cache.set(key, reply)
+            return reply, new_context
+        except Exception as e:
+            outcome = 'error'
+            self.breaker.record_failure()
+            logger.warning(f"Watson Assistant call failed: {e}")
+            raise
+        finally:
+            CHAT_BACKEND_SECONDS.observe(time.perf_counter() - start, backend='watson', outcome=outcome)
+            with self._lock:
+                self._in_flight -= 1
+
+    def reply(self, message, conversation_context):
+        """Return Watson's reply to ``message`` or None to signal local fallback
+
+        ``conversation_context`` is the per-conversation dict; Watson's context
+        is kept under its ``watson`` key between turns.
+        """
+        key = normalize_question(message)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if not self.breaker.allow_request():
+            CHAT_FALLBACKS.inc(reason='circuit_open')
+            return None
+
+        with self._lock:
+            if self._in_flight >= self.max_workers:
+                CHAT_FALLBACKS.inc(reason='saturated')
+                return None
+            self._in_flight += 1
+
+        future = self._executor.submit(self._run, key, message, conversation_context.get('watson'))
+        try:
+            reply, new_context = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            CHAT_FALLBACKS.inc(reason='timeout')
+            return None
+        except Exception:
+            CHAT_FALLBACKS.inc(reason='error')
+            return None
+
+        if new_context:
+            conversation_context['watson'] = new_context
+        if not reply:
+            CHAT_FALLBACKS.inc(reason='empty')
+        return reply or None
+
+    def after_fork(self):
+        """Fresh pool and counters in a forked worker"""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='watson')
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def status(self):
+        return {
+            'assistant_id': self.assistant_id,
+            'timeout': self.timeout,
+            'in_flight': self._in_flight,
+            'cache_entries': len(self.cache),
+            'breaker': self.breaker.snapshot()
+        }